@@ -3,7 +3,13 @@ from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_mongoengine import MongoEngine
 
-from settings.configuration import app_config
+import db_indexes
+from app import metrics, profiling, search
+from app.cache import catalog_cache
+from app.helpers import SpooledRequest, token_cache
+from app.upload_jobs import upload_queue
+from db_connection import mongo_pool
+from settings.configuration import S3Config, app_config
 
 mdb = MongoEngine()
 bcrypt = Bcrypt()
@@ -11,6 +17,7 @@ bcrypt = Bcrypt()
 
 def create_app(config_name):
     app = Flask(__name__)
+    app.request_class = SpooledRequest
     app.config.from_object(app_config[config_name])
     app.config['DEBUG'] = {
         'title': 'Grain Library',
@@ -36,6 +43,14 @@ def create_app(config_name):
         'specs_route': '/apidocs/'
     }
     mdb.init_app(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    mongo_pool.init_app(app)
+    db_indexes.init_app(app)
+    catalog_cache.init_app(app)
+    search.init_app(app)
+    upload_queue.init_app(app)
+    token_cache.configure(maxsize=app.config.get('TOKEN_CACHE_SIZE'), ttl=app.config.get('TOKEN_CACHE_TTL'))
     bcrypt.init_app(app)
     CORS(app)
 
@@ -53,3 +68,15 @@ def create_app(config_name):
     app.register_blueprint(content_blueprint)
     app.register_blueprint(user)
     return app
+
+
+def warm_up(app):
+    # Clients are created lazily; call this once per worker to pay the connection cost before the first request
+    if not app.config.get('WARM_UP_ON_START'):
+        return
+    if not mongo_pool.health_check(force=True):
+        print("Warm-up: MongoDB is not reachable")
+    try:
+        S3Config().get_s3_client()
+    except Exception as e:
+        print(f"Warm-up: S3 client could not be created: {e}")
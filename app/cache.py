@@ -0,0 +1,205 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from app.identity_map import find_one
+from db_connection import database_connect_mongo
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries expire after ``ttl`` seconds (or earlier, when the caller
+    passes a wall-clock ``expires_at``). Hits and misses are counted for ``stats()``.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        lifetime = self.ttl if ttl is None else ttl
+        if expires_at is not None:
+            # expires_at is an epoch timestamp (e.g. a JWT exp); never keep an entry past it
+            lifetime = min(lifetime, expires_at - time.time())
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + lifetime, value)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return entry[1] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class LocalBackend:
+    """
+    In-process backend: an LRU per worker. The generation is the data set's counter in the ``versions`` collection
+    (moved by ``catalog_changed`` on every write), so one worker's invalidation reaches every other worker too.
+    """
+
+    def __init__(self, maxsize=512, ttl=60):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, ttl):
+        self.entries.set(key, value, ttl=ttl)
+
+    def generation(self, name):
+        # Read through the identity map, so the view's own result_etag lookup reuses this document
+        version = find_one(database_connect_mongo()["versions"], {"_id": name}) or {}
+        return version.get("n", 0)
+
+    def bump(self, name):
+        # Nothing to do: the writer has already moved the shared counter with bump_version
+        pass
+
+    def stats(self):
+        return self.entries.stats()
+
+
+class RedisBackend:
+    """Shared backend: every worker sees the same entries and the same invalidations."""
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def generation(self, name):
+        return int(self.client.get(name) or 0)
+
+    def bump(self, name):
+        self.client.incr(name)
+
+    def stats(self):
+        return {"backend": "redis"}
+
+
+class ResponseCache:
+    """
+    Read-through cache for JSON endpoints whose data only changes through a few admin writes.
+
+    Entries are keyed by path and normalized request body, and live under a generation number: ``invalidate()``
+    bumps the generation so every older entry is ignored without having to find and delete it.
+    """
+
+    def __init__(self, namespace, ttl=60, maxsize=512):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.backend = LocalBackend(maxsize=maxsize, ttl=ttl)
+        self.enabled = True
+
+    def init_app(self, app):
+        self.ttl = app.config.get("RESPONSE_CACHE_TTL", self.ttl)
+        self.enabled = app.config.get("RESPONSE_CACHE_ENABLED", True)
+        if app.config.get("RESPONSE_CACHE_BACKEND") == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_URL"])
+        else:
+            self.backend = LocalBackend(maxsize=app.config.get("RESPONSE_CACHE_SIZE", 512), ttl=self.ttl)
+
+    def key(self, path, body):
+        normalized = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+        digest = hashlib.sha256(f"{path}\n{normalized}".encode()).hexdigest()
+        return f"{self.namespace}:{self.backend.generation(self.namespace)}:{digest}"
+
+    def invalidate(self):
+        try:
+            self.backend.bump(self.namespace)
+        except Exception as e:
+            print(f"Response cache invalidation failed: {e}")
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return view(*args, **kwargs)
+            try:
+                key = self.key(request.path, request.get_json(silent=True))
+                body = self.backend.get(key)
+            except Exception as e:
+                print(f"Response cache lookup failed: {e}")
+                return view(*args, **kwargs)
+            if body is not None:
+                # Stored as "<etag>\n<json body>" so a hit can still answer If-None-Match with a 304
+                etag, _, body = body.partition(b"\n")
+                etag = etag.decode()
+                if etag and request.if_none_match.contains(etag):
+                    response = current_app.response_class(status=304)
+                else:
+                    response = current_app.response_class(body, status=200, mimetype="application/json")
+                if etag:
+                    response.set_etag(etag)
+                return response
+
+            rv = view(*args, **kwargs)
+            response, status = rv if isinstance(rv, tuple) else (rv, getattr(rv, "status_code", 200))
+            if status == 200:
+                etag, _ = response.get_etag()
+                try:
+                    self.backend.set(key, (etag or "").encode() + b"\n" + response.get_data(), self.ttl)
+                except Exception as e:
+                    print(f"Response cache store failed: {e}")
+            return rv
+
+        return wrapper
+
+    def stats(self):
+        return self.backend.stats()
+
+
+catalog_cache = ResponseCache("catalog")
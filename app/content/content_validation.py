@@ -1,13 +1,14 @@
 import re
 
 from bson import ObjectId
-from marshmallow import Schema, fields, validates, ValidationError
+from marshmallow import fields, validates, ValidationError
 from werkzeug.datastructures import FileStorage as File
 
+from app.profiling import ProfiledSchema
 from db_connection import database_connect_mongo
 
 
-class StoryUpload(Schema):
+class StoryUpload(ProfiledSchema):
     story = fields.Raw(required=True)
     g_v_id = fields.Str(required=True)
     conserved_by = fields.Str(required=True)
@@ -100,7 +101,7 @@ class StoryUpload(Schema):
             raise ValidationError('Type ID must be story')
 
 
-class PreHarvestMorphologyUpload(Schema):
+class PreHarvestMorphologyUpload(ProfiledSchema):
     g_v_id = fields.Str(required=True)
     plant_height = fields.Str(required=True)
     culm_internode_colour = fields.Str(required=True)
@@ -557,7 +558,7 @@ class PreHarvestMorphologyUpload(Schema):
             raise ValidationError('Type ID must be pre_harvest_morphology')
 
 
-class PostHarvestMorphologyUpload(Schema):
+class PostHarvestMorphologyUpload(ProfiledSchema):
     g_v_id = fields.Str(required=True)
     panicle_density = fields.Str(required=True)
     panicle_threshability = fields.Str(required=True)
@@ -999,7 +1000,7 @@ class PostHarvestMorphologyUpload(Schema):
             raise ValidationError('Type ID must be post_harvest_morphology')
 
 
-class EcoRegionUpload(Schema):
+class EcoRegionUpload(ProfiledSchema):
     eco_region_img = fields.Raw(required=True)
     eco_region_link = fields.Str(required=True)
     g_v_id = fields.Str(required=True)
@@ -1066,7 +1067,7 @@ class EcoRegionUpload(Schema):
         #     raise ValidationError('Eco region details must be between 20 and 30 words')
 
 
-class CulinaryUpload(Schema):
+class CulinaryUpload(ProfiledSchema):
     g_v_id = fields.Str(required=True)
     culinary = fields.Raw(required=True)
     pic_one = fields.Raw(required=True)
@@ -1135,7 +1136,7 @@ class CulinaryUpload(Schema):
             raise ValidationError('Type ID must be culinary')
 
 
-class AgronomyUpload(Schema):
+class AgronomyUpload(ProfiledSchema):
     g_v_id = fields.Str(required=True)
     day_of_seed_sowing = fields.Str(required=True)
     field_preparation_weeding = fields.Str(required=True)
@@ -8,11 +8,26 @@ from marshmallow.exceptions import ValidationError
 
 from app.content.content_validation import StoryUploadSchema, CulinaryUploadSchema, EcoRegionUploadSchema, \
     PostHarvestMorphologyUploadSchema, PreHarvestMorphologyUploadSchema, AgronomyUploadSchema
+from app.etag import catalog_changed, document_etag, not_modified, with_etag, cache_control
 from app.helpers import S3Uploader
+from app.identity_map import find_one, updated
+from app.search import content_search
+from app.upload_jobs import upload_queue
 from db_connection import start_and_check_mongo, database_connect_mongo, stop_and_check_mongo_status, conn
 from settings.configuration import S3Config
 
 content_blueprint = Blueprint('content', __name__)
+cache_control(content_blueprint, "private, no-cache")
+
+
+def accept_upload(db, validated_data, pictures, type_id, label):
+    # Async mode: the pictures go to S3 in the background; the client polls /content/upload_status with job_id
+    job = upload_queue.submit(db, validated_data, pictures, type_id)
+    validated_data["_id"] = str(validated_data["_id"])
+    response = {"message": f"{label} accepted, files are being uploaded", "status": "success",
+                "job_id": str(job["_id"]), "data": validated_data}
+    stop_and_check_mongo_status(conn)
+    return make_response(jsonify(response)), 202
 
 
 class StoryUpload(MethodView):
@@ -68,30 +83,29 @@ class StoryUpload(MethodView):
                         # Update the created_at field
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
+                        if upload_queue.wants_async():
+                            return accept_upload(db, validated_data,
+                                                 {"pic_one": pic_one, "pic_two": pic_two, "pic_three": pic_three},
+                                                 type_id, "Story")
+
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
                         try:
-                            file_url1 = s3_uploader.upload_file(pic_one, type_id="story", status="pending")
-                            file_url2 = s3_uploader.upload_file(pic_two, type_id="story", status="pending")
-                            file_url3 = s3_uploader.upload_file(pic_three, type_id="story", status="pending")
-                            file_url = [file_url1, file_url2, file_url3]
+                            # One batch, so a failed picture releases the ones already uploaded
+                            file_url1, file_url2, file_url3 = s3_uploader.upload_files(
+                                [pic_one, pic_two, pic_three], type_id="story", status="pending")
                         except Exception as e:
                             response = {"message": str(e), "status": "val_error"}
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        if s3_uploader.check_existing_file_story(file_url, type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
-
                         # Insert the data into the database
                         validated_data["pic_one"] = file_url1
                         validated_data["pic_two"] = file_url2
                         validated_data["pic_three"] = file_url3
                         validated_data["type_id"] = type_id
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
 
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
@@ -231,68 +245,41 @@ class PreHarvestMorphologyUpload(MethodView):
                     else:
                         # Update the created_at field
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                        pictures = {
+                            "plant_height_pic": plant_height_pic,
+                            "collar_colour_pic": collar_colour_pic,
+                            "culm_internode_colour_pic": culm_internode_colour_pic,
+                            "leaf_blade_colour_pic": leaf_blade_colour_pic,
+                            "leaf_blade_length_pic": leaf_blade_length_pic,
+                            "flag_leaf_angle_pic": flag_leaf_angle_pic,
+                            "leaf_blade_width_pic": leaf_blade_width_pic,
+                            "panicle_length_pic": panicle_length_pic,
+                            "ligule_shape_pic": ligule_shape_pic,
+                            "ligule_colour_pic": ligule_colour_pic,
+                            "ligule_length_pic": ligule_length_pic,
+                            "panicle_axis_pic": panicle_axis_pic,
+                            "panicle_type_pic": panicle_type_pic,
+                            "panicle_exertion_pic": panicle_exertion_pic,
+                        }
+
+                        if upload_queue.wants_async():
+                            return accept_upload(db, validated_data, pictures, type_id, "Pre Harvest Morphology")
+
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
                         try:
-                            file_url1 = s3_uploader.upload_file(plant_height_pic, type_id="pre_harvest_morphology",
-                                                                status="pending")
-                            file_url2 = s3_uploader.upload_file(collar_colour_pic, type_id="pre_harvest_morphology",
-                                                                status="pending")
-                            file_url3 = s3_uploader.upload_file(culm_internode_colour_pic,
-                                                                type_id="pre_harvest_morphology", status="pending")
-                            file_url4 = s3_uploader.upload_file(leaf_blade_colour_pic,
-                                                                type_id="pre_harvest_morphology", status="pending")
-                            file_url5 = s3_uploader.upload_file(leaf_blade_length_pic,
-                                                                type_id="pre_harvest_morphology", status="pending")
-                            file_url6 = s3_uploader.upload_file(flag_leaf_angle_pic, type_id="pre_harvest_morphology",
-                                                                status="pending")
-                            file_url7 = s3_uploader.upload_file(leaf_blade_width_pic, type_id="pre_harvest_morphology",
-                                                                status="pending")
-                            file_url8 = s3_uploader.upload_file(panicle_length_pic, type_id="pre_harvest_morphology",
-                                                                status="pending")
-                            file_url9 = s3_uploader.upload_file(ligule_shape_pic, type_id="pre_harvest_morphology",
+                            file_url = s3_uploader.upload_files(pictures.values(), type_id="pre_harvest_morphology",
                                                                 status="pending")
-                            file_url10 = s3_uploader.upload_file(ligule_colour_pic, type_id="pre_harvest_morphology",
-                                                                 status="pending")
-                            file_url11 = s3_uploader.upload_file(ligule_length_pic, type_id="pre_harvest_morphology",
-                                                                 status="pending")
-                            file_url12 = s3_uploader.upload_file(panicle_axis_pic, type_id="pre_harvest_morphology",
-                                                                 status="pending")
-                            file_url13 = s3_uploader.upload_file(panicle_type_pic, type_id="pre_harvest_morphology",
-                                                                 status="pending")
-                            file_url14 = s3_uploader.upload_file(panicle_exertion_pic, type_id="pre_harvest_morphology",
-                                                                 status="pending")
-
-                            file_url = [file_url1, file_url2, file_url3, file_url4, file_url5, file_url6, file_url7,
-                                        file_url8, file_url9, file_url10, file_url11, file_url12, file_url13,
-                                        file_url14]
                         except Exception as e:
                             response = {"message": str(e), "status": "val_error"}
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        if s3_uploader.check_existing_file_content(file_url, type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
                         # Insert the data into the database
-                        validated_data["plant_height_pic"] = file_url1
-                        validated_data["collar_colour_pic"] = file_url2
-                        validated_data["culm_internode_colour_pic"] = file_url3
-                        validated_data["leaf_blade_colour_pic"] = file_url4
-                        validated_data["leaf_blade_length_pic"] = file_url5
-                        validated_data["flag_leaf_angle_pic"] = file_url6
-                        validated_data["leaf_blade_width_pic"] = file_url7
-                        validated_data["panicle_length_pic"] = file_url8
-                        validated_data["ligule_shape_pic"] = file_url9
-                        validated_data["ligule_colour_pic"] = file_url10
-                        validated_data["ligule_length_pic"] = file_url11
-                        validated_data["panicle_axis_pic"] = file_url12
-                        validated_data["panicle_type_pic"] = file_url13
-                        validated_data["panicle_exertion_pic"] = file_url14
+                        validated_data.update(zip(pictures, file_url))
                         validated_data["type_id"] = type_id
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
                         # validated_data["s3_total_files"] = total_files
@@ -424,80 +411,41 @@ class PostHarvestMorphologyUpload(MethodView):
                 else:
                     # Update the updated_at field
                     validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                    pictures = {
+                        "panicle_density_pic": panicle_density_pic,
+                        "panicle_threshability_pic": panicle_threshability_pic,
+                        "awning_pic": awning_pic,
+                        "awning_length_pic": awning_length_pic if awning != "Absent" else None,
+                        "awning_colour_pic": awning_colour_pic if awning != "Absent" else None,
+                        "grain_weight_pic": grain_weight_pic,
+                        "lemma_palea_colour_pic": lemma_palea_colour_pic,
+                        "lemma_palea_pubescence_pic": lemma_palea_pubescence_pic,
+                        "grain_length_pic": grain_length_pic,
+                        "grain_width_pic": grain_width_pic,
+                        "kernel_colour_pic": kernel_colour_pic,
+                        "kernel_length_pic": kernel_length_pic,
+                        "kernel_width_pic": kernel_width_pic,
+                        "scent_pic": scent_pic,
+                    }
+
+                    if upload_queue.wants_async():
+                        return accept_upload(db, validated_data, pictures, type_id, "Post Harvest Morphology")
+
                     s3_config = S3Config()
-                    bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                     s3_uploader = S3Uploader(s3_config)
                     try:
-                        file_url1 = s3_uploader.upload_file(panicle_density_pic, type_id="post_harvest_morphology",
+                        uploaded = s3_uploader.upload_files(pictures.values(), type_id="post_harvest_morphology",
                                                             status="pending")
-                        file_url2 = s3_uploader.upload_file(panicle_threshability_pic,
-                                                            type_id="post_harvest_morphology", status="pending")
-                        file_url3 = s3_uploader.upload_file(awning_pic, type_id="post_harvest_morphology",
-                                                            status="pending")
-                        if awning != "Absent":
-                            file_url4 = s3_uploader.upload_file(awning_length_pic,
-                                                                type_id="post_harvest_morphology",
-                                                                status="pending")
-                            file_url5 = s3_uploader.upload_file(awning_colour_pic,
-                                                                type_id="post_harvest_morphology",
-                                                                status="pending")
-                        else:
-                            file_url4 = None
-                            file_url5 = None
-
-                        file_url6 = s3_uploader.upload_file(grain_weight_pic, type_id="post_harvest_morphology",
-                                                            status="pending")
-                        file_url7 = s3_uploader.upload_file(lemma_palea_colour_pic,
-                                                            type_id="post_harvest_morphology", status="pending")
-                        file_url8 = s3_uploader.upload_file(lemma_palea_pubescence_pic,
-                                                            type_id="post_harvest_morphology", status="pending")
-                        file_url9 = s3_uploader.upload_file(grain_length_pic, type_id="post_harvest_morphology",
-                                                            status="pending")
-                        file_url10 = s3_uploader.upload_file(grain_width_pic, type_id="post_harvest_morphology",
-                                                             status="pending")
-                        file_url11 = s3_uploader.upload_file(kernel_colour_pic, type_id="post_harvest_morphology",
-                                                             status="pending")
-                        file_url12 = s3_uploader.upload_file(kernel_length_pic, type_id="post_harvest_morphology",
-                                                             status="pending")
-                        file_url13 = s3_uploader.upload_file(kernel_width_pic, type_id="post_harvest_morphology",
-                                                             status="pending")
-                        file_url14 = s3_uploader.upload_file(scent_pic, type_id="post_harvest_morphology",
-                                                             status="pending")
-
-                        if awning != "Absent":
-                            file_url = [file_url1, file_url2, file_url3, file_url4, file_url5, file_url6, file_url7,
-                                        file_url8, file_url9, file_url10, file_url11, file_url12, file_url13,
-                                        file_url14]
-                        else:
-                            file_url = [file_url1, file_url2, file_url3, file_url6, file_url7, file_url8, file_url9,
-                                        file_url10, file_url11, file_url12, file_url13, file_url14]
-
                     except Exception as e:
                         response = {"message": str(e), "status": "val_error"}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
-                    if s3_uploader.check_existing_file_story(file_url, type_id):
-                        response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
                     # Insert the data into the database
-                    validated_data["panicle_density_pic"] = file_url1
-                    validated_data["panicle_threshability_pic"] = file_url2
-                    validated_data["awning_pic"] = file_url3
-                    validated_data["awning_length_pic"] = file_url4 if awning != "Absent" else None
-                    validated_data["awning_colour_pic"] = file_url5 if awning != "Absent" else None
-                    validated_data["grain_weight_pic"] = file_url6
-                    validated_data["lemma_palea_colour_pic"] = file_url7
-                    validated_data["lemma_palea_pubescence_pic"] = file_url8
-                    validated_data["grain_length_pic"] = file_url9
-                    validated_data["grain_width_pic"] = file_url10
-                    validated_data["kernel_colour_pic"] = file_url11
-                    validated_data["kernel_length_pic"] = file_url12
-                    validated_data["kernel_width_pic"] = file_url13
-                    validated_data["scent_pic"] = file_url14
+                    validated_data.update(zip(pictures, uploaded))
                     validated_data["type_id"] = type_id
-                    db1.insert_one(validated_data)
+                    with s3_uploader.release_on_error(validated_data):
+                        db1.insert_one(validated_data)
                     # Extract the _id value
                     validated_data["_id"] = str(validated_data["_id"])
                     # validated_data["s3_total_files"] = total_files
@@ -576,8 +524,12 @@ class EcoRegionUpload(MethodView):
                     else:
                         # Update the created_at field
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+                        if upload_queue.wants_async():
+                            return accept_upload(db, validated_data, {"eco_region_img": eco_region_img}, type_id,
+                                                 "Eco Region")
+
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
                         try:
                             file_url = s3_uploader.upload_file(eco_region_img, type_id="eco_region", status="pending")
@@ -586,14 +538,11 @@ class EcoRegionUpload(MethodView):
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        if s3_uploader.check_existing_file(file_url, type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
                         # Insert the data into the database
                         validated_data["eco_region_img"] = file_url
                         validated_data["type_id"] = type_id
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
                         # validated_data["s3_total_files"] = total_files
@@ -676,28 +625,28 @@ class CulinaryUpload(MethodView):
                     else:
                         # Update the created_at field
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                        if upload_queue.wants_async():
+                            return accept_upload(db, validated_data, {"pic_one": pic_one, "pic_two": pic_two},
+                                                 type_id, "Culinary")
+
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
 
                         try:
-                            file_url1 = s3_uploader.upload_file(pic_one, type_id="culinary", status="pending")
-                            file_url2 = s3_uploader.upload_file(pic_two, type_id="culinary", status="pending")
-                            file_urls = [file_url1, file_url2]
+                            # One batch, so a failed picture releases the ones already uploaded
+                            file_url1, file_url2 = s3_uploader.upload_files([pic_one, pic_two], type_id="culinary",
+                                                                            status="pending")
                         except Exception as e:
                             response = {"message": str(e), "status": "val_error"}
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        if s3_uploader.check_existing_file_content(file_urls, type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
                         # Insert the data into the database
                         validated_data["pic_one"] = file_url1
                         validated_data["pic_two"] = file_url2
                         validated_data["type_id"] = type_id
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
                         # validated_data["s3_total_files"] = total_files
@@ -748,26 +697,24 @@ class CulinaryUpload(MethodView):
                     else:
                         # Update the created_at field
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                        if upload_queue.wants_async():
+                            return accept_upload(db, validated_data, {"pic_one": pic_one}, type_id, "Culinary")
+
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
 
                         try:
                             file_url1 = s3_uploader.upload_file(pic_one, type_id="culinary", status="pending")
-                            file_urls = [file_url1]
                         except Exception as e:
                             response = {"message": str(e), "status": "val_error"}
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        if s3_uploader.check_existing_file_content(file_urls, type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
                         # Insert the data into the database
                         validated_data["pic_one"] = file_url1
                         validated_data["type_id"] = type_id
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
                         # validated_data["s3_total_files"] = total_files
@@ -876,43 +823,35 @@ class AgronomyUpload(MethodView):
 
                         # Update the created_at field
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                        pictures = {
+                            "day_of_seed_sowing_pic": day_of_seed_sowing_pic,
+                            "field_preparation_weeding_pic": field_preparation_weeding_pic,
+                            "transplantation_pic": transplantation_pic,
+                            "tillering_starts_pic": tillering_starts_pic,
+                            "flowering_pic": flowering_pic,
+                            "harvest_pic": harvest_pic,
+                        }
+
+                        if upload_queue.wants_async():
+                            return accept_upload(db, validated_data, pictures, type_id, "Agronomy")
+
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
-
                         try:
-                            file_url1 = s3_uploader.upload_file(day_of_seed_sowing_pic, type_id="agronomy",
-                                                                status="pending")
-                            file_url2 = s3_uploader.upload_file(field_preparation_weeding_pic, type_id="agronomy",
-                                                                status="pending")
-                            file_url3 = s3_uploader.upload_file(transplantation_pic, type_id="agronomy",
-                                                                status="pending")
-                            file_url4 = s3_uploader.upload_file(tillering_starts_pic, type_id="agronomy",
-                                                                status="pending")
-                            file_url5 = s3_uploader.upload_file(flowering_pic, type_id="agronomy", status="pending")
-                            file_url6 = s3_uploader.upload_file(harvest_pic, type_id="agronomy", status="pending")
-                            file_urls = [file_url1, file_url2, file_url3, file_url4, file_url5, file_url6]
+                            file_urls = s3_uploader.upload_files(pictures.values(), type_id="agronomy",
+                                                                 status="pending")
                         except Exception as e:
                             response = {"message": str(e), "status": "val_error"}
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        if s3_uploader.check_existing_file_content(file_urls, type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
-
                         # Insert the data into the database
 
-                        validated_data["day_of_seed_sowing_pic"] = file_url1
-                        validated_data["field_preparation_weeding_pic"] = file_url2
-                        validated_data["transplantation_pic"] = file_url3
-                        validated_data["tillering_starts_pic"] = file_url4
-                        validated_data["flowering_pic"] = file_url5
-                        validated_data["harvest_pic"] = file_url6
+                        validated_data.update(zip(pictures, file_urls))
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
                         validated_data["type_id"] = type_id
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
 
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
@@ -956,7 +895,7 @@ class content_approval_update(MethodView):
 
                 if content_id and status and remarks:
 
-                    find_content = db1.find_one({"_id": ObjectId(content_id), "type_id": type_id})
+                    find_content = find_one(db1, {"_id": ObjectId(content_id), "type_id": type_id})
 
                     if find_content["status"] == "approve":
                         response = {"message": {"Details": ["Content already approved"]}, "status": "val_error"}
@@ -970,7 +909,7 @@ class content_approval_update(MethodView):
 
                     g_v_id = find_content.get("g_v_id", "Grain variant ID not found")
 
-                    grain_variant = db2.find_one({"_id": ObjectId(g_v_id), "status": "active"})
+                    grain_variant = find_one(db2, {"_id": ObjectId(g_v_id), "status": "active"})
 
                     if not grain_variant:
                         response = {"message": {"Details": ["Grain variant not found"]}, "status": "val_error"}
@@ -981,9 +920,24 @@ class content_approval_update(MethodView):
 
                         approve_status = grain_variant.get("approve_status", "Approve status not found")
 
-                        db1.update_one({"_id": ObjectId(content_id), "type_id": type_id}, {
-                            "$set": {"status": status, "remarks": remarks,
-                                     "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}})
+                        changes = {"status": status, "remarks": remarks,
+                                   "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}
+                        # Only applies if nobody changed the status since it was read, so a delete releases the
+                        # pictures exactly once. Read before updated(), which rewrites find_content in place.
+                        previous_status = find_content["status"]
+                        result = db1.update_one({"_id": ObjectId(content_id), "type_id": type_id,
+                                                 "status": previous_status}, {"$set": changes})
+                        if not result.matched_count:
+                            response = {"message": {"Details": ["Content was changed meanwhile, please retry"]},
+                                        "status": "val_error"}
+                            stop_and_check_mongo_status(conn)
+                            return make_response(jsonify(response)), 400
+                        if status == "delete" and previous_status != "delete":
+                            S3Uploader(S3Config()).release_files(find_content)
+                        updated(db1, ObjectId(content_id), changes)
+                        # content_search.update reads this content and its grain variant again; the identity map
+                        # answers both from the documents fetched above
+                        content_search.update(db, ObjectId(content_id), status)
 
                         if approve_status == "pending":
                             db2.update_one(
@@ -998,6 +952,9 @@ class content_approval_update(MethodView):
                                 {"$addToSet": {"approve_status": type_id},
                                  "$set": {"updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}}
                             )
+                        updated(db2, ObjectId(g_v_id))
+
+                        catalog_changed(db)
 
                         response = {"status": "success", "message": "Content updated successfully"}
                         stop_and_check_mongo_status(conn)
@@ -1036,13 +993,20 @@ class FetchContent(MethodView):
 
                 if type_id and g_v_id and status:
 
-                    content_details = db1.find_one({"g_v_id": g_v_id, "type_id": type_id, "status": status})
+                    query = {"g_v_id": g_v_id, "type_id": type_id, "status": status}
+                    content_details = db1.find_one(query)
                     if content_details:
                         content_details["_id"] = str(content_details["_id"])
+                        etag = document_etag(content_details, data)
+                        unchanged = not_modified(etag)
+                        if unchanged is not None:
+                            stop_and_check_mongo_status(conn)
+                            return unchanged
+
                         response = {"message": "Content fetched successfully", "status": "success",
                                     "data": content_details}
                         stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 200
+                        return with_etag(make_response(jsonify(response)), etag), 200
                     else:
                         response = {"message": {"Details": ["No content found"]}, "status": "val_error"}
                         stop_and_check_mongo_status(conn)
@@ -1066,6 +1030,46 @@ class FetchContent(MethodView):
             return make_response(jsonify(response)), 400
 
 
+class UploadStatus(MethodView):
+    @cross_origin(supports_credentials=True)
+    def post(self):
+        try:
+            start_and_check_mongo()
+            db = database_connect_mongo()
+            if db is not None:
+                data = request.get_json()
+                job_id = data["job_id"]
+
+                if job_id:
+                    job = upload_queue.status(db, job_id)
+                    if job:
+                        response = {"message": "Upload status fetched successfully", "status": "success",
+                                    "data": job}
+                        stop_and_check_mongo_status(conn)
+                        return make_response(jsonify(response)), 200
+                    else:
+                        response = {"message": {"Details": ["Upload job not found"]}, "status": "val_error"}
+                        stop_and_check_mongo_status(conn)
+                        return make_response(jsonify(response)), 404
+
+                else:
+                    response = {"status": 'val_error', "message": {"Details": ["Please enter all details"]}}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 400
+
+            else:
+                response = {"status": 'val_error', "message": {"Details": ["Database connection failed"]}}
+                stop_and_check_mongo_status(conn)
+                return make_response(jsonify(response)), 400
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            response = {"status": 'val_error', "message": f'{str(e)}'}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
+
 story_upload = StoryUpload.as_view('story_upload')
 pre_harvest_morphology = PreHarvestMorphologyUpload.as_view('pre_harvest_morphology')
 post_harvest_morphology = PostHarvestMorphologyUpload.as_view('post_harvest_morphology')
@@ -1074,6 +1078,7 @@ culinary = CulinaryUpload.as_view('culinary')
 agronomy = AgronomyUpload.as_view('agronomy')
 content_approval_update = content_approval_update.as_view('content_approval_update')
 fetch_content = FetchContent.as_view('fetch_content')
+upload_status = UploadStatus.as_view('upload_status')
 
 content_blueprint.add_url_rule('/content/story_upload', view_func=story_upload, methods=['POST'])
 content_blueprint.add_url_rule('/content/pre_harvest_morphology', view_func=pre_harvest_morphology, methods=['POST'])
@@ -1083,3 +1088,4 @@ content_blueprint.add_url_rule('/content/culinary', view_func=culinary, methods=
 content_blueprint.add_url_rule('/content/agronomy', view_func=agronomy, methods=['POST'])
 content_blueprint.add_url_rule('/content/content_approval_update', view_func=content_approval_update, methods=['POST'])
 content_blueprint.add_url_rule('/content/fetch_content', view_func=fetch_content, methods=['POST'])
+content_blueprint.add_url_rule('/content/upload_status', view_func=upload_status, methods=['POST'])
@@ -1,15 +1,18 @@
 import re
 
-from marshmallow import Schema, fields, validates, ValidationError, validates_schema
+from marshmallow import fields, validate, validates, ValidationError, validates_schema
 from werkzeug.datastructures import FileStorage as File
 
+from app.profiling import ProfiledSchema
+from app.queries import find_conflicts
+from app.transitions import STATUSES, StatusChangeSchema
 from db_connection import database_connect_mongo
 
 name_check = re.compile(r"^[a-zA-Z\s]*\S$")
 phone_pattern = re.compile(r'^\d{10}$')
 
 
-class EmployeeRegistrationSchema(Schema):
+class EmployeeRegistrationSchema(ProfiledSchema):
     status = fields.Str(required=True)
     type_id = fields.Str(required=True)
     created_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", required=True)
@@ -32,13 +35,6 @@ class EmployeeRegistrationSchema(Schema):
         if value not in ['admin', 'sub_admin', 'editor']:
             raise ValidationError("Please select a valid type ID. It should be either 'admin', 'sub_admin' or 'editor'")
 
-    @validates('email_id')
-    def validate_email_id(self, value):
-        db = database_connect_mongo()
-        db1 = db["employee_registration"]
-        if db1.count_documents({"email_id": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("Email already exists")
-
     @validates('profile_pic')
     def validate_profile_pic(self, value):
         if not value:
@@ -60,31 +56,52 @@ class EmployeeRegistrationSchema(Schema):
         if value not in ['aadhar', 'voter']:
             raise ValidationError("Please select a valid ID proof type. It should be either 'Aadhar' or 'Voter'.")
 
-    @validates_schema()
-    def validate_id_no(self, data, **kwargs):
-        db = database_connect_mongo()
-        db1 = db["employee_registration"]
-        if data["id_proof"] == "aadhar":
-            aadhar_pattern = re.compile(r'^\d{12}$')
-            if not aadhar_pattern.match(data["id_no"]):
-                raise ValidationError({"id_no": ["Please enter a valid Aadhar card number (12 characters)"]})
-            if db1.count_documents({"id_no": {"$eq": data["id_no"]}}, collation={"locale": "en", "strength": 2}) > 0:
-                raise ValidationError("Aadhar already exists")
-        elif data["id_proof"] == "voter":
-            voter_pattern = re.compile(r'^[A-Z]{3}\d{7}$')
-            if not voter_pattern.match(data["id_no"]):
-                raise ValidationError({"id_no": ["Please enter a valid Voter ID number (10 characters)"]})
-            if db1.count_documents({"id_no": {"$eq": data["id_no"]}}, collation={"locale": "en", "strength": 2}) > 0:
-                raise ValidationError("Voter ID already exists")
-
     @validates('phone_number')
     def validate_phone_number(self, value):
-        db = database_connect_mongo()
-        db1 = db["employee_registration"]
         if not phone_pattern.match(value):
             raise ValidationError("Please enter a valid phone number (10 digits).")
-        if db1.count_documents({"phone_number": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("Phone number already exists")
+
+    @validates_schema(skip_on_field_errors=False)
+    def validate_unique(self, data, **kwargs):
+        # Email, phone number and ID number are checked with one query. Fields that failed their own validation
+        # are not in `data` and are not checked; the ID number, as before, only once every field is valid.
+        id_no_error = None
+        check_id_no = all(name in data for name in self.load_fields)
+        if check_id_no and data["id_proof"] == "aadhar":
+            if not re.match(r'^\d{12}$', data["id_no"]):
+                id_no_error = "Please enter a valid Aadhar card number (12 characters)"
+        elif check_id_no and data["id_proof"] == "voter":
+            if not re.match(r'^[A-Z]{3}\d{7}$', data["id_no"]):
+                id_no_error = "Please enter a valid Voter ID number (10 characters)"
+
+        checks = []
+        if "email_id" in data:
+            checks.append(("email_id", "employee_registration", {"email_id": data["email_id"]}, False))
+        if "phone_number" in data:
+            checks.append(("phone_number", "employee_registration", {"phone_number": data["phone_number"]}, False))
+        if check_id_no and not id_no_error:
+            checks.append(("id_no", "employee_registration", {"id_no": data["id_no"]}, False))
+        found = find_conflicts(database_connect_mongo(), checks) if checks else set()
+
+        errors = {}
+        if "email_id" in found:
+            errors["email_id"] = ["Email already exists"]
+        if "phone_number" in found:
+            errors["phone_number"] = ["Phone number already exists"]
+        if id_no_error:
+            errors["id_no"] = [id_no_error]
+        elif "id_no" in found:
+            errors["_schema"] = ["Aadhar already exists" if data["id_proof"] == "aadhar" else "Voter ID already exists"]
+        if errors:
+            raise ValidationError(errors)
+
+
+class EmployeeStatusChangeSchema(StatusChangeSchema):
+    status_field = "emp_status"
+    type_id = fields.Str(required=True)
+    emp_id = fields.Str(required=True)
+    emp_status = fields.Str(required=True, validate=validate.OneOf(STATUSES))
 
 
 employee_registration_schema = EmployeeRegistrationSchema()
+employee_status_change_schema = EmployeeStatusChangeSchema()
@@ -6,8 +6,11 @@ from flask.views import MethodView
 from flask_cors import cross_origin
 from marshmallow.exceptions import ValidationError
 
-from app.employee_access.employee_validation import employee_registration_schema
+from app.employee_access.employee_validation import employee_registration_schema, employee_status_change_schema
+from app.etag import catalog_changed
 from app.helpers import S3Uploader
+from app.queries import PageError, parse_page, find_with_counts, count_total
+from app.transitions import TransitionError, change_status
 from db_connection import start_and_check_mongo, database_connect_mongo, stop_and_check_mongo_status, conn
 from settings.configuration import S3Config
 
@@ -57,19 +60,14 @@ class EmployeeRegistration(MethodView):
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
                         file_url = s3_uploader.upload_file(profile_pic, type_id=type_id, status="active")
 
-                        if s3_uploader.check_existing_file(file_url['file_url'], type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
-
                         # Insert the data into the database
                         validated_data["profile_pic"] = file_url
                         validated_data["loc_assign"] = "false"
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
 
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
@@ -112,17 +110,20 @@ class AllEmployee(MethodView):
                 type_id = data["type_id"]
                 assign = data["assign"]
 
+                page = parse_page(data)
+
                 if type_id and assign is None or assign == "":
-                    find_employee = db1.find({"status": {"$ne": "delete"}, "type_id": type_id},
-                                             {"password": 0}).sort("status", 1)
-                    find_employee_list = list(find_employee)
-                    total_employee = db1.count_documents({"status": {"$ne": "delete"}, "type_id": type_id})
+                    find_employee_list, status_counts, page_info = find_with_counts(
+                        db1, {"status": {"$ne": "delete"}, "type_id": type_id}, {"password": 0}, "status", page)
+                    total_employee = count_total(status_counts)
 
                     if total_employee != 0:
                         for i in find_employee_list:
                             i["_id"] = str(i["_id"])
                         response = {"status": "success", "data": find_employee_list, "total_employee": total_employee,
-                                    "message": "Employee fetched successfully"}
+                                    "status_counts": status_counts, "message": "Employee fetched successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
                     else:
@@ -131,18 +132,18 @@ class AllEmployee(MethodView):
                         return make_response(jsonify(response)), 400
 
                 if type_id and assign:
-                    find_employee = db1.find({"status": {"$ne": "delete"}, "type_id": type_id, "loc_assign": assign},
-                                             {"password": 0}).sort(
-                        "status", 1)
-                    find_employee_list = list(find_employee)
-                    total_employee = db1.count_documents(
-                        {"status": {"$ne": "delete"}, "type_id": type_id, "loc_assign": assign})
+                    find_employee_list, status_counts, page_info = find_with_counts(
+                        db1, {"status": {"$ne": "delete"}, "type_id": type_id, "loc_assign": assign}, {"password": 0},
+                        "status", page)
+                    total_employee = count_total(status_counts)
 
                     if total_employee != 0:
                         for i in find_employee_list:
                             i["_id"] = str(i["_id"])
                         response = {"status": "success", "data": find_employee_list, "total_employee": total_employee,
-                                    "message": "Employee fetched successfully"}
+                                    "status_counts": status_counts, "message": "Employee fetched successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
                     else:
@@ -160,6 +161,11 @@ class AllEmployee(MethodView):
                 stop_and_check_mongo_status(conn)
                 return make_response(jsonify(response)), 400
 
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -380,47 +386,42 @@ class EmployeeStatusChange(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["employee_registration"]
-                data = request.get_json()
+                try:
+                    data = employee_status_change_schema.load(request.get_json())
+                except ValidationError as err:
+                    response = {"message": err.messages, "status": "val_error"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 400
                 type_id = data["type_id"]
                 employee_id = data["emp_id"]
                 emp_status = data["emp_status"]
 
                 if type_id and employee_id and emp_status:
 
-                    current_status = db1.find_one({"type_id": type_id, "_id": ObjectId(employee_id)}, {"status": 1})
-
-                    if current_status is None:
-                        response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == "delete":
-                        response = {"status": 'val_error',
-                                    "message": {"Employee": ["Employee not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == emp_status:
-                        response = {"status": 'val_error',
-                                    "message": {"Employee": [f"Employee is already {emp_status}"]}}
+                    try:
+                        document = change_status(db1, {"type_id": type_id, "_id": ObjectId(employee_id)}, emp_status)
+                    except TransitionError as err:
+                        if err.reason == "not_found":
+                            response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
+                        elif err.reason == "deleted":
+                            response = {"status": 'val_error',
+                                        "message": {"Employee": ["Employee not found"]}}
+                        elif err.reason == "unchanged":
+                            response = {"status": 'val_error',
+                                        "message": {"Employee": [f"Employee is already {emp_status}"]}}
+                        else:
+                            response = {"status": 'val_error',
+                                        "message": {"Employee": [f"Employee cannot be changed from {err.current} "
+                                                                 f"to {emp_status}"]}}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
-                    else:
-                        update_status = db1.update_one(
-                            {"type_id": type_id, "_id": ObjectId(employee_id), "status": {"$ne": "delete"}},
-                            {"$set": {"status": emp_status,
-                                      "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}})
-
-                        if update_status.acknowledged and update_status.modified_count == 1:
-                            response = {"status": "success", "message": f"Employee {emp_status} successfully"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 200
-
-                        else:
-                            response = {"status": "error", "message": "Employee not updated"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
+                    if emp_status == "delete":
+                        # The document is gone for good; drop its references to the uploaded pictures
+                        S3Uploader(S3Config()).release_files(document)
+                    response = {"status": "success", "message": f"Employee {emp_status} successfully"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 200
 
                 else:
                     response = {"status": 'val_error', "message": {"Details": ["Please enter all details"]}}
@@ -709,6 +710,7 @@ class EditorAssign(MethodView):
                             "updated_at": str(dt.datetime.now().strftime(
                                 "%Y-%m-%d %H:%M:%S")),
                             "editor_id": employee_id, "emp_assign": "true", "employee": editor["employee_name"]}})
+                        catalog_changed(db)
 
                         if editor_update.acknowledged and editor_update.modified_count == 1 and \
                                 grain_variant_update.acknowledged and grain_variant_update.modified_count == 1:
@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+from flask import current_app, request
+
+from app.cache import catalog_cache
+from app.identity_map import find_one
+
+
+def bump_version(db, name):
+    db["versions"].update_one({"_id": name}, {"$inc": {"n": 1}}, upsert=True)
+
+
+def result_etag(db, name, request_body=None):
+    """
+    Strong ETag for a response built from the ``name`` data set: its version counter, plus the path and request
+    body (so different endpoints, pages or projections of the same data get different tags).
+
+    The counter lives in the ``versions`` collection and is bumped by every write to the data set (see
+    ``catalog_changed``), so the check is a single ``_id`` lookup and two writes in the same second still give
+    different tags. Changes made to the database by hand are not seen until the next write through the API.
+    """
+    version = find_one(db["versions"], {"_id": name}) or {}
+    body = json.dumps(request_body, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.path}\n{version.get('n', 0)}\n{body}".encode()).hexdigest()
+
+
+def document_etag(document, request_body=None):
+    # For endpoints that return a single document anyway: tag the document itself, no extra query
+    raw = json.dumps([document, request_body], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def catalog_changed(db):
+    """Call after every write to ``grain_assign``: moves the catalog ETags on and drops cached responses."""
+    bump_version(db, "catalog")
+    catalog_cache.invalidate()
+
+
+def not_modified(etag):
+    # 304 with no body when the client already holds this version, otherwise None
+    if etag and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    return response
+
+
+def cache_control(blueprint, default):
+    """Set the blueprint's Cache-Control policy (``CACHE_CONTROL[blueprint.name]`` in config, else ``default``)."""
+
+    @blueprint.after_request
+    def set_cache_control(response):
+        if "Cache-Control" not in response.headers:
+            policy = current_app.config.get("CACHE_CONTROL", {}).get(blueprint.name, default)
+            if policy:
+                response.headers["Cache-Control"] = policy
+        return response
+
+    return set_cache_control
@@ -1,8 +1,11 @@
 import re
 
-from marshmallow import Schema, fields, validates, ValidationError, validates_schema
+from marshmallow import fields, validate, validates, ValidationError, validates_schema
 from werkzeug.datastructures import FileStorage as File
 
+from app.profiling import ProfiledSchema
+from app.queries import find_conflicts
+from app.transitions import STATUSES, StatusChangeSchema
 from db_connection import database_connect_mongo
 
 ALPHABET_ERROR_MESSAGE = "Please enter alphabet only for name field"
@@ -10,7 +13,7 @@ name_check = "^[a-zA-Z\s]*\S$"
 password_check = "^(?=.*[A-Za-z])(?=.*\d)(?=.*[@$!%*#?&])[A-Za-z\d@$!%*#?&]{8,}$"
 
 
-class GrainRegistrationSchema(Schema):
+class GrainRegistrationSchema(ProfiledSchema):
     status = fields.Str(required=True)
     created_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", required=True)
     updated_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", allow_none=True)
@@ -19,9 +22,7 @@ class GrainRegistrationSchema(Schema):
 
     @validates('grain')
     def validate_grain(self, value):
-        db = database_connect_mongo()
-        db1 = db["grain"]
-        if db1.count_documents({"grain": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
+        if find_conflicts(database_connect_mongo(), [("grain", "grain", {"grain": value}, False)]):
             raise ValidationError({"message": {"grain": ["This grain is already added"]}})
 
         if not re.match(name_check, value):
@@ -44,7 +45,7 @@ class GrainRegistrationSchema(Schema):
             raise ValidationError('Picture must be between 300KB and 1MB')
 
 
-class GrainVariantRegistrationSchema(Schema):
+class GrainVariantRegistrationSchema(ProfiledSchema):
     status = fields.Str(required=True)
     created_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", required=True)
     updated_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", allow_none=True)
@@ -54,10 +55,9 @@ class GrainVariantRegistrationSchema(Schema):
 
     @validates_schema()
     def validate_grain_variant(self, validates_fields, **kwargs):
-        db = database_connect_mongo()
-        db1 = db["grain"]
-        if db1.count_documents(
-                {"grain": validates_fields['grain'], "grain_variant": validates_fields['grain_variant']}):
+        checks = [("grain_variant", "grain",
+                   {"grain": validates_fields['grain'], "grain_variant": validates_fields['grain_variant']}, True)]
+        if find_conflicts(database_connect_mongo(), checks):
             raise ValidationError({"grain_variant": ["This variant already added under this grain"]})
 
         if not re.match(name_check, validates_fields["grain_variant"]):
@@ -74,7 +74,7 @@ class GrainVariantRegistrationSchema(Schema):
     #         raise ValidationError({"grain_variant": [ALPHABET_ERROR_MESSAGE]})
 
 
-class GrainVariantPicSchema(Schema):
+class GrainVariantPicSchema(ProfiledSchema):
     gv_pic = fields.Raw(required=True)
 
     @validates('gv_pic')
@@ -94,6 +94,21 @@ class GrainVariantPicSchema(Schema):
             raise ValidationError('Picture must be between 300KB and 1MB')
 
 
+class GrainStatusChangeSchema(StatusChangeSchema):
+    status_field = "g_status"
+    gs_id = fields.Str(required=True)
+    type_id = fields.Str(required=True)
+    g_status = fields.Str(required=True, validate=validate.OneOf(STATUSES))
+
+
+class GrainVariantStatusChangeSchema(StatusChangeSchema):
+    status_field = "g_a_status"
+    g_a_id = fields.Str(required=True)
+    g_a_status = fields.Str(required=True, validate=validate.OneOf(STATUSES))
+
+
 grain_registration_schema = GrainRegistrationSchema()
 grain_variant_registration_schema = GrainVariantRegistrationSchema()
 grain_variant_pic_schema = GrainVariantPicSchema()
+grain_status_change_schema = GrainStatusChangeSchema()
+grain_variant_status_change_schema = GrainVariantStatusChangeSchema()
@@ -1,5 +1,4 @@
 import datetime as dt
-from itertools import groupby
 
 from bson import ObjectId
 from flask import Blueprint, make_response, jsonify, request
@@ -7,8 +6,13 @@ from flask.views import MethodView
 from flask_cors import cross_origin
 from marshmallow.exceptions import ValidationError
 
-from app.grain.grain_validation import grain_registration_schema, grain_variant_registration_schema
+from app.grain.grain_validation import grain_registration_schema, grain_variant_registration_schema, \
+    grain_status_change_schema, grain_variant_status_change_schema
+from app.etag import catalog_changed
 from app.helpers import S3Uploader
+from app.queries import PageError, parse_page, find_with_counts, count_total
+from app.search import variant_search
+from app.transitions import TransitionError, change_status
 from db_connection import start_and_check_mongo, database_connect_mongo, stop_and_check_mongo_status, conn
 from settings.configuration import S3Config
 
@@ -49,21 +53,16 @@ class AddGrain(MethodView):
                         validated_data["created_at"] = str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
                         file_url = s3_uploader.upload_file(grain_pic, type_id=type_id, status="active")
 
-                        if s3_uploader.check_existing_file(file_url['file_url'], type_id):
-                            response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
-
                         validated_data["grain_pic"] = file_url
 
                         # Add type field
                         validated_data["type_id"] = type_id
 
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
 
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
@@ -164,18 +163,21 @@ class FetchAllGrain(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["grain"]
-                find_grain = db1.find({"status": {"$ne": "delete"}, "type_id": "grain"},
-                                      {"grain": 1, "status": 1, "grain_pic": 1}).sort("grain", 1)
-                find_grain_list = list(find_grain)
-                total_grain = db1.count_documents({"status": "active", "type_id": "grain"})
+                page = parse_page(request.get_json(silent=True))
+                find_grain_list, status_counts, page_info = find_with_counts(
+                    db1, {"status": {"$ne": "delete"}, "type_id": "grain"}, {"grain": 1, "status": 1, "grain_pic": 1},
+                    "grain", page)
+                total_grain = count_total(status_counts, "active")
 
                 if total_grain != 0:
                     for i in find_grain_list:
                         i["_id"] = str(i["_id"])
                     response = {"status": "success", "data": find_grain_list, "total_grain": total_grain,
-                                "message": "Grain "
-                                           "fetched "
-                                           "successfully"}
+                                "status_counts": status_counts, "message": "Grain "
+                                                                           "fetched "
+                                                                           "successfully"}
+                    if page_info:
+                        response["page"] = page_info
                     stop_and_check_mongo_status(conn)
                     return make_response(jsonify(response)), 200
                 else:
@@ -188,6 +190,11 @@ class FetchAllGrain(MethodView):
                 stop_and_check_mongo_status(conn)
                 return make_response(jsonify(response)), 400
 
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -244,20 +251,21 @@ class FetchAllGrainVariant(MethodView):
                 grain = data["grain"]
 
                 if grain:
-                    find_grain_variant = db1.find(
-                        {"status": {"$ne": "delete"}, "type_id": "grain_variant", "grain": grain},
-                        {"grain_variant": 1}).sort("status", 1)
-                    find_grain_variant_list = list(find_grain_variant)
-                    total_grain_variant = db1.count_documents(
-                        {"status": "active", "type_id": "grain_variant", "grain": grain})
+                    page = parse_page(data)
+                    find_grain_variant_list, status_counts, page_info = find_with_counts(
+                        db1, {"status": {"$ne": "delete"}, "type_id": "grain_variant", "grain": grain},
+                        {"grain_variant": 1}, "status", page)
+                    total_grain_variant = count_total(status_counts, "active")
 
                     if total_grain_variant != 0:
                         for i in find_grain_variant_list:
                             i["_id"] = str(i["_id"])
                         response = {"status": "success", "data": find_grain_variant_list,
-
+                                    "status_counts": status_counts,
                                     "total_grain_variant": total_grain_variant, "message": "Grain variant fetched "
                                                                                            "successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
 
@@ -277,6 +285,11 @@ class FetchAllGrainVariant(MethodView):
                 stop_and_check_mongo_status(conn)
                 return make_response(jsonify(response)), 400
 
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -312,28 +325,15 @@ class FetchAllGrainAndVariant(MethodView):
                         for i in find_grain_variant_list:
                             i["_id"] = str(i["_id"])
 
-                        a = []
-
-                        for i in find_grain_variant_list:
-                            i["_id"] = str(i["_id"])
-                            e = list(db2.find({"g_v_id": i["_id"]}))
-                            for j in e:
-                                type_id = j["type_id"]
-                                status = j["status"]
-                                g_v_id = j["g_v_id"]
-                                a.append({"type_id": type_id, "status": status, "_id": g_v_id})
-                        a.sort(key=lambda x: x['_id'])
-                        result = [{'_id': k, 'approval': [{'type_id': x['type_id'], 'status': x['status']} for x in v]}
-                                  for
-                                  k, v in groupby(a, key=lambda x: x['_id'])]
-
                         # Create a dictionary to map _id values to documents in list1
                         id_map = {doc['_id']: doc for doc in find_grain_variant_list}
 
-                        # Iterate over list2 and append approval field to corresponding document in list1
-                        for doc in result:
-                            if doc['_id'] in id_map:
-                                id_map[doc['_id']]['approval'] = doc['approval']
+                        # One round trip for every variant's content; approvals are grouped per variant here
+                        contents = db2.find({"g_v_id": {"$in": list(id_map)}},
+                                            {"_id": 0, "g_v_id": 1, "type_id": 1, "status": 1})
+                        for j in contents:
+                            id_map[j["g_v_id"]].setdefault("approval", []).append(
+                                {"type_id": j["type_id"], "status": j["status"]})
 
                         # Convert the dictionary back to a list
                         result = list(id_map.values())
@@ -418,44 +418,40 @@ class GStatusChange(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["grain"]
-                data = request.get_json()
-                g_status = data["g_status"].lower()
+                try:
+                    data = grain_status_change_schema.load(request.get_json())
+                except ValidationError as err:
+                    response = {"message": err.messages, "status": "val_error"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 400
+                g_status = data["g_status"]
                 gs_id = data["gs_id"]
                 type_id = data["type_id"]
 
                 if g_status and gs_id and type_id:
 
-                    current_status = db1.find_one({"_id": ObjectId(gs_id), "type_id": type_id, }, {"status": 1})
-
-                    if current_status is None:
-                        response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == "delete":
-                        response = {"status": 'val_error', "message": {"Details": ["Grain not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == g_status:
-                        response = {"status": 'val_error', "message": {"Details": [f"Grain is already {g_status}"]}}
+                    try:
+                        document = change_status(db1, {"_id": ObjectId(gs_id), "type_id": type_id}, g_status)
+                    except TransitionError as err:
+                        if err.reason == "not_found":
+                            response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
+                        elif err.reason == "deleted":
+                            response = {"status": 'val_error', "message": {"Details": ["Grain not found"]}}
+                        elif err.reason == "unchanged":
+                            response = {"status": 'val_error', "message": {"Details": [f"Grain is already {g_status}"]}}
+                        else:
+                            response = {"status": 'val_error',
+                                        "message": {"Details": [f"Grain cannot be changed from {err.current} to "
+                                                                f"{g_status}"]}}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
-                    else:
-                        update_status = db1.update_one(
-                            {"_id": ObjectId(gs_id), "type_id": type_id, "status": {"$ne": "delete"}},
-                            {"$set": {"status": g_status,
-                                      "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}})
-
-                        if update_status.acknowledged and update_status.modified_count == 1:
-                            response = {"status": "success", "message": f"Grain {g_status} successfully"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 200
-                        else:
-                            response = {"status": "error", "message": "Grain not updated"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
+                    if g_status == "delete":
+                        # The document is gone for good; drop its references to the uploaded pictures
+                        S3Uploader(S3Config()).release_files(document)
+                    response = {"status": "success", "message": f"Grain {g_status} successfully"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 200
                 else:
                     response = {"status": 'val_error', "message": {"Details": ["Please enter all details"]}}
                     stop_and_check_mongo_status(conn)
@@ -482,44 +478,41 @@ class GAStatusChange(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["grain_assign"]
-                data = request.get_json()
-                g_status = data["g_status"].lower()
+                try:
+                    data = grain_status_change_schema.load(request.get_json())
+                except ValidationError as err:
+                    response = {"message": err.messages, "status": "val_error"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 400
+                g_status = data["g_status"]
                 gs_id = data["gs_id"]
                 type_id = data["type_id"]
 
                 if g_status and gs_id and type_id:
 
-                    current_status = db1.find_one({"_id": ObjectId(gs_id), "type_id": type_id, }, {"status": 1})
-
-                    if current_status is None:
-                        response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == "delete":
-                        response = {"status": 'val_error', "message": {"Details": ["Grain not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == g_status:
-                        response = {"status": 'val_error', "message": {"Details": [f"Grain is already {g_status}"]}}
+                    try:
+                        document = change_status(db1, {"_id": ObjectId(gs_id), "type_id": type_id}, g_status)
+                    except TransitionError as err:
+                        if err.reason == "not_found":
+                            response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
+                        elif err.reason == "deleted":
+                            response = {"status": 'val_error', "message": {"Details": ["Grain not found"]}}
+                        elif err.reason == "unchanged":
+                            response = {"status": 'val_error', "message": {"Details": [f"Grain is already {g_status}"]}}
+                        else:
+                            response = {"status": 'val_error',
+                                        "message": {"Details": [f"Grain cannot be changed from {err.current} to "
+                                                                f"{g_status}"]}}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
-                    else:
-                        update_status = db1.update_one(
-                            {"_id": ObjectId(gs_id), "type_id": type_id, "status": {"$ne": "delete"}},
-                            {"$set": {"status": g_status,
-                                      "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}})
-
-                        if update_status.acknowledged and update_status.modified_count == 1:
-                            response = {"status": "success", "message": f"Grain {g_status} successfully"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 200
-                        else:
-                            response = {"status": "error", "message": "Grain not updated"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
+                    catalog_changed(db)
+                    if g_status == "delete":
+                        # The document is gone for good; drop its references to the uploaded pictures
+                        S3Uploader(S3Config()).release_files(document)
+                    response = {"status": "success", "message": f"Grain {g_status} successfully"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 200
                 else:
                     response = {"status": 'val_error', "message": {"Details": ["Please enter all details"]}}
                     stop_and_check_mongo_status(conn)
@@ -574,11 +567,14 @@ class AssignGrain(MethodView):
 
                         else:
 
+                            # The assignment shows the grain's picture, so it holds its own reference to it
+                            S3Uploader(S3Config()).retain_file(grain_pic)
                             db3.insert_one({"grain": grain_name, "country": location_name, "status": "active",
                                             "grain_pic": grain_pic,
                                             "type_id": "grain_assign", "g_id": g_id, "loc_id": loc_id,
                                             "created_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
                                             "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))})
+                            catalog_changed(db)
 
                             response = {"status": "success",
                                         "message": f"{grain_name} assigned to {location_name} successfully"}
@@ -1013,15 +1009,9 @@ class AssignGrainVariant(MethodView):
                             #     return make_response(jsonify(response)), 400
 
                             s3_config = S3Config()
-                            bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                             s3_uploader = S3Uploader(s3_config)
                             file_url = s3_uploader.upload_file(gv_pic, type_id=type_id, status="active")
 
-                            if s3_uploader.check_existing_file(file_url['file_url'], type_id):
-                                response = {"message": {"File": ["File already exist"]}, "status": "val_error"}
-                                stop_and_check_mongo_status(conn)
-                                return make_response(jsonify(response)), 400
-
                             validate_data["type_id"] = type_id
                             validate_data["approve_status"] = "pending"
                             validate_data["emp_assign"] = "false"
@@ -1034,7 +1024,9 @@ class AssignGrainVariant(MethodView):
                             validate_data["created_at"] = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                             validate_data["updated_at"] = None
 
-                            db3.insert_one(validate_data)
+                            with s3_uploader.release_on_error(validate_data):
+                                db3.insert_one(variant_search.with_keys(validate_data))
+                            catalog_changed(db)
 
                             # db3.insert_one({"grain": grain_name, "country": country_name, "region": region_name,
                             #                 "grain_variant": grain_variant, "status": "active",
@@ -1080,39 +1072,39 @@ class GrainVariantStatusChange(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["grain_assign"]
-                data = request.get_json()
-                g_a_status = data["g_a_status"].lower()
+                try:
+                    data = grain_variant_status_change_schema.load(request.get_json())
+                except ValidationError as err:
+                    response = {"message": err.messages, "status": "val_error"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 400
+                g_a_status = data["g_a_status"]
                 g_a_id = data["g_a_id"]
 
                 if g_a_status and g_a_id:
 
-                    current_status = db1.find_one({"_id": ObjectId(g_a_id), "status": {"$ne": "delete"}})
-
-                    if current_status is None:
-                        response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
-                        stop_and_check_mongo_status(conn)
-                        return make_response(jsonify(response)), 400
-
-                    if current_status["status"] == g_a_status:
-                        response = {"status": 'val_error',
-                                    "message": {"Details": [f"Grain variant is already {g_a_status}"]}}
+                    try:
+                        document = change_status(db1, {"_id": ObjectId(g_a_id)}, g_a_status)
+                    except TransitionError as err:
+                        if err.reason in ("not_found", "deleted"):
+                            response = {"status": 'val_error', "message": {"DB": ["Data not found"]}}
+                        elif err.reason == "unchanged":
+                            response = {"status": 'val_error',
+                                        "message": {"Details": [f"Grain variant is already {g_a_status}"]}}
+                        else:
+                            response = {"status": 'val_error',
+                                        "message": {"Details": [f"Grain variant cannot be changed from {err.current} "
+                                                                f"to {g_a_status}"]}}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
-                    else:
-                        update_status = db1.update_one(
-                            {"_id": ObjectId(g_a_id), "status": {"$ne": "delete"}},
-                            {"$set": {"status": g_a_status,
-                                      "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}})
-
-                        if update_status.acknowledged and update_status.modified_count == 1:
-                            response = {"status": "success", "message": f"Grain variant {g_a_status} successfully"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 200
-                        else:
-                            response = {"status": "val_error", "message": "Grain variant not updated"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
+                    catalog_changed(db)
+                    if g_a_status == "delete":
+                        # The document is gone for good; drop its references to the uploaded pictures
+                        S3Uploader(S3Config()).release_files(document)
+                    response = {"status": "success", "message": f"Grain variant {g_a_status} successfully"}
+                    stop_and_check_mongo_status(conn)
+                    return make_response(jsonify(response)), 200
                 else:
                     response = {"status": 'val_error', "message": {"Details": ["Please enter all details"]}}
                     stop_and_check_mongo_status(conn)
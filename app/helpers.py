@@ -1,14 +1,34 @@
 import datetime as dt
-import io
+import hashlib
 import os
-import random
+import tempfile
 import threading
-from functools import wraps
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from functools import wraps, partial
 
 import jwt
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, Request
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
+from app import metrics
+from app.cache import TTLCache
+from app.profiling import profiled
 from db_connection import database_connect_mongo
+from db_indexes import ensure_required_indexes
+
+
+
+# Verified admin tokens. Nothing evicts an entry early: a token deactivated in the jwt collection is rejected once
+# its entry expires, so TOKEN_CACHE_TTL is the longest a revoked token keeps working on a worker.
+token_cache = TTLCache(maxsize=1024, ttl=30)
+
+
+def token_cache_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()
 
 
 def Admin_Access(U):
@@ -21,94 +41,235 @@ def Admin_Access(U):
         # Get the token from the request headers
         token = request.headers.get('token')
 
-        # Check if the token is valid and not expired
-        try:
-            decoded_token = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-
-        except jwt.InvalidTokenError:
-            return jsonify({"message": "Invalid token", "status": "val_error"}), 401
-
-        # Connect to the MongoDB database
-        db = database_connect_mongo()
-        db1 = db["jwt"]
-
-        # Check if the token is active in the database
-        if db1.find_one({"token": token, "status": "active"}):
-            # Check if the user has admin role
-            if decoded_token.get("role_id") == '1':
-                # If admin, call the original function
-                return U(*args, **kwargs)
-            else:
-                # If not admin, return an error response
-                return jsonify({"message": "unauthorized access", "status": "val_error"}), 401
+        # Tokens verified recently are served from memory; a deactivated token is seen once the entry's
+        # revalidation window (TOKEN_CACHE_TTL) runs out
+        cache_key = token_cache_key(token) if token else None
+        decoded_token = token_cache.get(cache_key) if cache_key else None
+
+        if decoded_token is None:
+            # Check if the token is valid and not expired
+            try:
+                decoded_token = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+
+            except jwt.InvalidTokenError:
+                return jsonify({"message": "Invalid token", "status": "val_error"}), 401
+
+            # Connect to the MongoDB database
+            db = database_connect_mongo()
+            db1 = db["jwt"]
+
+            # Check if the token is active in the database
+            if not db1.find_one({"token": token, "status": "active"}, {"_id": 1}):
+                # If the token is not active, return an error response
+                return jsonify({"message": "Token is not active", "status": "val_error"}), 401
+
+            token_cache.set(cache_key, decoded_token, expires_at=decoded_token.get("exp"))
+
+        # Check if the user has admin role
+        if decoded_token.get("role_id") == '1':
+            # If admin, call the original function
+            return U(*args, **kwargs)
         else:
-            # If the token is not active, return an error response
-            return jsonify({"message": "Token is not active", "status": "val_error"}), 401
+            # If not admin, return an error response
+            return jsonify({"message": "unauthorized access", "status": "val_error"}), 401
 
     return wrapper
 
 
 class S3Uploader:
-    def __init__(self, s3_config):
+    def __init__(self, s3_config, max_workers=None):
         self.s3_config = s3_config
         self.s3 = self.s3_config.get_s3_client()
+        self.max_workers = max_workers or s3_config.upload_max_workers
+        self.transfer_config = s3_config.get_transfer_config()
+        self.blobs = database_connect_mongo()["file_blobs"]
+        ensure_required_indexes(self.blobs.database, "file_blobs")
 
+    @profiled("s3")
     def upload_file(self, file, on_progress=None, type_id=None, status=None):
-        with io.BytesIO(file.read()) as f:
-            folder_path = f"{type_id}/{status}/"
-            file_name = folder_path + str(random.randint(1000, 10000)) + '_' + dt.datetime.now().strftime(
-                "%Y%m%d_%H%M%S_%f") + '.' + file.filename.split('.')[-1]
-            progress_percentage = ProgressPercentage(file, on_progress)
-            self.s3.upload_fileobj(f, self.s3_config.get_bucket_name(), file_name,
-                                   ExtraArgs={'ContentDisposition': 'inline', 'ContentType': file.content_type},
-                                   Callback=progress_percentage)
-            file_url = f"https://{self.s3_config.get_bucket_name()}.s3.{self.s3_config.get_region_name()}.amazonaws.com/{file_name}"
-            return {'file_url': file_url, 'progress': f"{progress_percentage.get_progress()}%"}
-
-    def check_existing_file(self, file_url, type_id):
-        db = database_connect_mongo()
-        db1 = db["employee_registration"]
-        if db1.find_one({"$and": [{'profile_pic.file_url': file_url}, {"type_id": type_id}]}):
-            return True
-        return False
+        # Content-addressed: identical bytes are stored once and shared through a reference count in file_blobs
+        stream = getattr(file, "stream", file)
+        sha256 = hash_stream(stream)
+        blob = self.blobs.find_one_and_update(
+            {"sha256": sha256},
+            {"$inc": {"ref_count": 1}, "$set": {"updated_at": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}},
+            return_document=ReturnDocument.AFTER)
+        if blob is not None:
+            metrics.upload_files.inc(type_id=type_id, result="deduplicated")
+            if on_progress:
+                on_progress(100.0)
+            return {'file_url': blob["file_url"], 'progress': "100.0%", 'sha256': sha256}
+
+        # Stream straight from the upload's own (spooled) stream; large files go up as a multipart upload. Every
+        # upload gets its own key, so releasing an old blob of the same bytes can never delete this object.
+        file_name = f"{type_id}/{status}/{sha256}-{uuid.uuid4().hex[:12]}." + file.filename.split('.')[-1]
+        progress_percentage = ProgressPercentage(stream, on_progress)
+        size = stream_size(stream)
+        started_at = time.perf_counter()
+        self.s3.upload_fileobj(stream, self.s3_config.get_bucket_name(), file_name,
+                               ExtraArgs={'ContentDisposition': 'inline', 'ContentType': file.content_type},
+                               Callback=progress_percentage, Config=self.transfer_config)
+        metrics.record_upload(type_id, size, time.perf_counter() - started_at)
+        file_url = f"https://{self.s3_config.get_bucket_name()}.s3.{self.s3_config.get_region_name()}.amazonaws.com/{file_name}"
+
+        blob = self.register_blob(sha256, file_name, file_url, file.content_type, size)
+        if blob["file_url"] != file_url:
+            # An identical upload under another prefix registered first; keep that copy only
+            self.delete_object(file_name)
+        return {'file_url': blob["file_url"], 'progress': f"{progress_percentage.get_progress()}%", 'sha256': sha256}
+
+    def register_blob(self, sha256, key, file_url, content_type, size):
+        now = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        update = {"$setOnInsert": {"key": key, "file_url": file_url, "content_type": content_type, "size": size,
+                                   "created_at": now},
+                  "$set": {"updated_at": now},
+                  "$inc": {"ref_count": 1}}
+        try:
+            return self.blobs.find_one_and_update({"sha256": sha256}, update, upsert=True,
+                                                  return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Concurrent upsert of the same bytes; the other insert won, so just take a reference to it
+            del update["$setOnInsert"]
+            return self.blobs.find_one_and_update({"sha256": sha256}, update, return_document=ReturnDocument.AFTER)
+
+    @profiled("s3")
+    def upload_files(self, files, on_progress=None, type_id=None, status=None):
+        """
+        Upload every file of one submission concurrently and return the results in submission order.
+
+        ``None`` entries are skipped and come back as ``None``. ``on_progress(index, percent)`` is called per file.
+        If any upload fails, pending uploads are cancelled, references taken by the finished ones are released
+        (deleting objects nobody else uses) and the error is re-raised.
+        """
+        files = list(files)
+        results = [None] * len(files)
+        pending = [(index, file) for index, file in enumerate(files) if file is not None]
+        if not pending:
+            return results
 
-    def check_existing_file_content(self, file_urls, type_id):
-        db = database_connect_mongo()
-        db1 = db["content"]
-        for file_url_dict in file_urls:
-            file_url = file_url_dict['file_url']
-            if db1.find_one({"$and": [{'pic_one.file_url': file_url}, {"type_id": type_id}]}):
-                return True
-            if db1.find_one({"$and": [{'pic_two.file_url': file_url}, {"type_id": type_id}]}):
-                return True
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending)),
+                                thread_name_prefix="s3-upload") as executor:
+            futures = {}
+            for index, file in pending:
+                callback = partial(on_progress, index) if on_progress else None
+                futures[executor.submit(self.upload_file, file, callback, type_id, status)] = index
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                for future in futures:
+                    if not future.cancelled() and future.exception() is None:
+                        self.release_file(future.result())
+                raise
+        return results
+
+    @profiled("s3")
+    def release_file(self, uploaded):
+        # Drop one reference; the object itself is deleted only when nothing else points at it
+        if not uploaded or not uploaded.get("sha256"):
+            return False
+        blob = self.blobs.find_one_and_update({"sha256": uploaded["sha256"]}, {"$inc": {"ref_count": -1}},
+                                              return_document=ReturnDocument.AFTER)
+        if blob is None or blob["ref_count"] > 0:
+            return False
+        # Only the caller that removes the blob document deletes the object; a dedup hit that took a reference
+        # in between keeps the count above zero and the delete does not match
+        blob = self.blobs.find_one_and_delete({"sha256": uploaded["sha256"], "ref_count": {"$lte": 0}})
+        if blob is not None:
+            return self.delete_object(blob["key"])
         return False
 
-    def check_existing_file_story(self, file_url, type_id):
-        db = database_connect_mongo()
-        db1 = db["story"]
-        if db1.find_one({"$and": [{'pic_one.file_url': file_url}, {"type_id": type_id}]}):
-            return True
-        if db1.find_one({"$and": [{'pic_two.file_url': file_url}, {"type_id": type_id}]}):
+    def retain_file(self, uploaded):
+        # Take one more reference, for a document that stores a copy of another document's upload
+        if not uploaded or not isinstance(uploaded, dict) or not uploaded.get("sha256"):
+            return False
+        return self.blobs.update_one({"sha256": uploaded["sha256"]}, {"$inc": {"ref_count": 1}}).modified_count == 1
+
+    @contextmanager
+    def release_on_error(self, document):
+        # Wraps the write that stores ``document``: if it fails, its uploads are released again
+        try:
+            yield
+        except Exception:
+            self.release_files(document)
+            raise
+
+    def release_files(self, document):
+        """Release every upload stored on ``document``; call it once, when the document is deleted."""
+        released = 0
+        for value in document.values():
+            if isinstance(value, dict) and value.get("sha256"):
+                released += bool(self.release_file(value))
+        return released
+
+    @profiled("s3")
+    def delete_object(self, key):
+        try:
+            self.s3.delete_object(Bucket=self.s3_config.get_bucket_name(), Key=key)
             return True
-        return False
+        except Exception as e:
+            print(f"Error deleting {key}: {e}")
+            return False
+
+
+class SpooledRequest(Request):
+    """
+    Request whose uploaded files are always spooled: up to ``UPLOAD_SPOOL_MAX_MEMORY`` bytes stay in memory,
+    anything larger goes to a temporary file, so memory per request stays bounded whatever the upload size.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_size = current_app.config.get("UPLOAD_SPOOL_MAX_MEMORY", 500 * 1024)
+        return tempfile.SpooledTemporaryFile(max_size=max_size, mode="rb+")
+
+
+def hash_stream(stream, chunk_size=1024 * 1024):
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def stream_size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
 
 
 class ProgressPercentage(object):
-    def __init__(self, file, on_progress=None):
+    """
+    boto3 transfer callback. It fires for every chunk, so ``on_progress`` is only called at most once per
+    ``min_interval`` seconds, plus once when the transfer completes.
+    """
+
+    def __init__(self, file, on_progress=None, min_interval=0.25):
         self._file = file
         self._seen_so_far = 0
-        self._total_size = os.fstat(file.fileno()).st_size
+        self._total_size = stream_size(getattr(file, "stream", file)) or 1
         self._lock = threading.Lock()
         self._on_progress = on_progress
         self._progress = 0
+        self._min_interval = min_interval
+        self._reported_at = 0.0
 
     def __call__(self, bytes_amount):
         with self._lock:
             self._seen_so_far += bytes_amount
             self._progress = (self._seen_so_far / self._total_size) * 100
-            if self._on_progress:
-                self._on_progress(self._progress)
-            print(f"\r{self._progress:.2f}%")
+            progress = self._progress
+            now = time.monotonic()
+            report = progress >= 100 or now - self._reported_at >= self._min_interval
+            if report:
+                self._reported_at = now
+        if report and self._on_progress:
+            self._on_progress(progress)
 
     def get_progress(self):
         return self._progress
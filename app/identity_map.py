@@ -0,0 +1,106 @@
+"""
+Request-scoped identity map for MongoDB documents.
+
+Validators and views that look up the same document during one request go through ``find_one`` here, which
+reads each document from MongoDB at most once and hands back the same object afterwards. A full document
+fetched by ``_id`` also answers later lookups of that ``_id`` with extra equality conditions (``status``,
+``type_id``) or an inclusion projection. Writes made during the request must be reported with ``updated`` so
+the map does not serve stale documents.
+
+Outside a request (upload workers, CLI commands) the calls go straight to MongoDB.
+"""
+from flask import g, has_request_context
+
+from app import metrics
+
+avoided_lookups = metrics.registry.counter(
+    "grain_identity_map_hits_total", "Document lookups answered from the request's identity map.", ("collection",))
+
+_MISSING = object()
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class IdentityMap:
+    def __init__(self):
+        self.by_id = {}
+        self.by_filter = {}
+
+    def find_one(self, collection, filter_, projection=None):
+        name = collection.name
+        key = (name, _freeze(filter_), _freeze(projection))
+        if key in self.by_filter:
+            avoided_lookups.inc(collection=name)
+            return self.by_filter[key]
+
+        document = self._from_id(name, filter_, projection)
+        if document is not _MISSING:
+            avoided_lookups.inc(collection=name)
+            return document
+
+        document = collection.find_one(filter_, projection)
+        self.by_filter[key] = document
+        if document is not None and projection is None:
+            self.by_id[(name, document["_id"])] = document
+        return document
+
+    def _from_id(self, name, filter_, projection):
+        _id = filter_.get("_id")
+        if isinstance(_id, (dict, list)):
+            return _MISSING
+        document = self.by_id.get((name, _id))
+        if document is None:
+            return _MISSING
+
+        # Only plain equality on scalar fields can be decided from the cached document
+        for field, value in filter_.items():
+            stored = document.get(field)
+            if isinstance(value, (dict, list)) or isinstance(stored, list):
+                return _MISSING
+            if stored != value:
+                return None
+
+        if projection is None:
+            return document
+        if not all(projection.values()):
+            return _MISSING
+        projected = {"_id": document["_id"]}
+        projected.update({field: document[field] for field in projection if field in document})
+        return projected
+
+    def updated(self, name, _id, values=None):
+        # Apply a $set to the cached document, or drop it when the change cannot be replayed here
+        document = self.by_id.get((name, _id))
+        if document is not None:
+            if values is None:
+                del self.by_id[(name, _id)]
+            else:
+                document.update(values)
+        self.by_filter = {key: value for key, value in self.by_filter.items() if key[0] != name}
+
+
+def current_identity_map():
+    if not has_request_context():
+        return None
+    if "identity_map" not in g:
+        g.identity_map = IdentityMap()
+    return g.identity_map
+
+
+def find_one(collection, filter_, projection=None):
+    identity_map = current_identity_map()
+    if identity_map is None:
+        return collection.find_one(filter_, projection)
+    return identity_map.find_one(collection, filter_, projection)
+
+
+def updated(collection, _id, values=None):
+    identity_map = current_identity_map()
+    if identity_map is not None:
+        identity_map.updated(collection.name, _id, values)
@@ -1,8 +1,10 @@
 import re
 
-from marshmallow import Schema, fields, validates, ValidationError, validates_schema
+from marshmallow import fields, validates, ValidationError, validates_schema, post_load
 from passlib.handlers.pbkdf2 import pbkdf2_sha256
 
+from app.profiling import ProfiledSchema
+from app.queries import find_by_email, find_conflicts
 from db_connection import database_connect_mongo
 
 ALPHABET_ERROR_MESSAGE = "Please enter alphabet only for name field"
@@ -10,7 +12,22 @@ name_check = "^[a-zA-Z\s]*\S$"
 password_check = "^(?=.*[A-Za-z])(?=.*\d)(?=.*[@$!%*#?&])[A-Za-z\d@$!%*#?&]{8,}$"
 
 
-class CountryRegistrationSchema(Schema):
+def email_checks(data):
+    if "email_id" not in data:
+        return []
+    return [("location_email", "location", {"email_id": data["email_id"]}, False),
+            ("employee_email", "employee_registration", {"email_id": data["email_id"]}, False)]
+
+
+def email_errors(found):
+    if "location_email" in found:
+        return {"email_id": ["Email already exists"]}
+    if "employee_email" in found:
+        return {"email_id": ["An employee with this email already exists"]}
+    return {}
+
+
+class CountryRegistrationSchema(ProfiledSchema):
     status = fields.Str(required=True)
     created_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", required=True)
     updated_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", allow_none=True)
@@ -19,34 +36,30 @@ class CountryRegistrationSchema(Schema):
     email_id = fields.Email(required=True)
     emp_assign = fields.Str(required=True)
 
-    @validates('location')
-    def validate_location(self, value):
-        db = database_connect_mongo()
-        db1 = db["location"]
-        if db1.count_documents({"location": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("This country already added")
-
-        if not re.match(name_check, value):
-            raise ValidationError(ALPHABET_ERROR_MESSAGE)
-
     @validates('password')
     def validate_password(self, value):
         if not re.match(password_check, value):
             raise ValidationError("Please enter Minimum eight characters, at least one letter, one number and one "
                                   "special character for password field")
 
-    @validates('email_id')
-    def validate_email_id(self, value):
-        db = database_connect_mongo()
-        db1 = db["location"]
-        db2 = db["employee_registration"]
-        if db1.count_documents({"email_id": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("Email already exists")
-        if db2.count_documents({"email_id": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("An employee with this email already exists")
+    @validates_schema(skip_on_field_errors=False)
+    def validate_unique(self, data, **kwargs):
+        # The country name and the email (against locations and employees) are checked with one query
+        checks = email_checks(data)
+        if "location" in data:
+            checks.append(("location", "location", {"location": data["location"]}, False))
+        found = find_conflicts(database_connect_mongo(), checks) if checks else set()
 
+        errors = email_errors(found)
+        if "location" in found:
+            errors["location"] = ["This country already added"]
+        elif "location" in data and not re.match(name_check, data["location"]):
+            errors["location"] = [ALPHABET_ERROR_MESSAGE]
+        if errors:
+            raise ValidationError(errors)
 
-class RegionRegistrationSchema(Schema):
+
+class RegionRegistrationSchema(ProfiledSchema):
     status = fields.Str(required=True)
     created_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", required=True)
     updated_at = fields.DateTime(format="%Y-%m-%d %H:%M:%S", allow_none=True)
@@ -56,26 +69,30 @@ class RegionRegistrationSchema(Schema):
     email_id = fields.Email(required=True)
     emp_assign = fields.Str(required=True)
 
-    @validates_schema
+    @validates_schema(skip_on_field_errors=False)
     def validate_region(self, data, **kwargs):
-        db = database_connect_mongo()
-        db1 = db["location"]
-        if db1.count_documents({"country": data['country'], "location": data['location']}):
+        # Email, country and region are checked with one query. As before, the region itself is only reported on
+        # once every other field is valid.
+        checks = email_checks(data)
+        if "country" in data:
+            checks.append(("country", "location", {"location": data["country"], "type_id": "country"}, False))
+        if "country" in data and "location" in data:
+            checks.append(("region", "location", {"country": data["country"], "location": data["location"]}, True))
+        found = find_conflicts(database_connect_mongo(), checks) if checks else set()
+
+        errors = email_errors(found)
+        if "country" in data and "country" not in found:
+            errors["country"] = ["Country not found"]
+        if errors:
+            raise ValidationError(errors)
+
+        if not all(name in data for name in self.load_fields):
+            return
+        if "region" in found:
             raise ValidationError({"region": ["This region already added under this country"]})
-
         if not re.match(name_check, data['location']):
             raise ValidationError(ALPHABET_ERROR_MESSAGE)
 
-    @validates('email_id')
-    def validate_email_id(self, value):
-        db = database_connect_mongo()
-        db1 = db["location"]
-        db2 = db["employee_registration"]
-        if db1.count_documents({"email_id": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("Email already exists")
-        if db2.count_documents({"email_id": {"$eq": value}}, collation={"locale": "en", "strength": 2}) > 0:
-            raise ValidationError("An employee with this email already exists")
-
     @validates('password')
     def validate_password(self, value):
         if not re.match(password_check, value):
@@ -83,24 +100,17 @@ class RegionRegistrationSchema(Schema):
                 "Please enter Minimum eight characters, at least one letter, one number and one special character for "
                 "password field")
 
-    @validates('country')
-    def validate_country(self, value):
-        db = database_connect_mongo()
-        db1 = db["location"]
-        if db1.count_documents({"location": {"$eq": value}, "type_id": "country"},
-                               collation={"locale": "en", "strength": 2}) == 0:
-            raise ValidationError("Country not found")
 
-
-class LoginSchema(Schema):
+class LoginSchema(ProfiledSchema):
     email_id = fields.Email(required=True)
     password = fields.Str(required=True)
 
-    @validates_schema
-    def validate_login(self, data, **kwargs):
+    @post_load
+    def authenticate(self, data, **kwargs):
+        # Loading returns the account itself, so the view does not look it up again
         db = database_connect_mongo()
         db1 = db["location"]
-        location = db1.find_one({"email_id": {"$eq": data['email_id']}}, collation={"locale": "en", "strength": 2})
+        location = find_by_email(db1, data['email_id'], status="active")
 
         if location is not None:
 
@@ -110,6 +120,8 @@ class LoginSchema(Schema):
             if not pbkdf2_sha256.verify(data['password'], location['password']):
                 raise ValidationError({"password": ["Password is incorrect"]})
 
+            return location
+
         else:
             raise ValidationError({"email_id": ["Email does not exist"]})
 
@@ -1,5 +1,4 @@
 import datetime as dt
-import re
 from datetime import datetime
 
 import jwt
@@ -13,6 +12,8 @@ from passlib.hash import pbkdf2_sha256
 
 from app.location.location_validation import country_registration_schema, region_registration_schema, \
     login_schema
+from app.queries import PageError, parse_page, find_page, find_with_counts, count_total
+from app.token_store import employee_tokens
 from db_connection import start_and_check_mongo, database_connect_mongo, stop_and_check_mongo_status, conn
 
 location_add = Blueprint('location_add', __name__)
@@ -185,8 +186,6 @@ class Login(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["location"]
-                db2 = db["login_token"]
-                db2.create_index("expired_at", expireAfterSeconds=0)
                 data = request.get_json()
                 email_id = data["email_id"].lower()
                 password = data["password"]
@@ -197,22 +196,13 @@ class Login(MethodView):
 
                     # Validate the data using the schema
                     try:
-                        login_schema.load(data)
+                        user = login_schema.load(data)
                     except ValidationError as err:
                         response = {"message": err.messages, "status": "val_error"}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
                     else:
-                        # simpler version to do check {"email_id": {"$regex": "^" + value + "$", "$options": "i"}}{
-                        # "email_id": {"$regex": "^" + value + "$", "$options": "i"}}
-                        user = db1.find_one(
-                            {"$and": [{'email_id': re.compile("^" + re.escape(email_id) + "$", re.IGNORECASE)}],
-                             "status": "active"})
-
-                        # Delete the previous token if exists(only single token)
-                        db2.delete_many({"e_id": str(user["_id"])})
-
                         e_token = jwt.encode(
                             {'_id': str(user["_id"]),
                              'exp': datetime.now(pytz.utc) + dt.timedelta(days=7)},
@@ -222,11 +212,11 @@ class Login(MethodView):
                         user["_id"] = str(user["_id"])
                         user["token"] = e_token
 
-                        # Save the token into the database
-                        db2.insert_one({"e_token": e_token, "e_id": str(user["_id"]),
-                                        "created_at": datetime.now(pytz.utc),
-                                        "local_time": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                        "expired_at": datetime.now(pytz.utc) + dt.timedelta(days=1)})
+                        # Save the token into the database, replacing the previous one (only single token)
+                        employee_tokens.save(db, user["_id"], e_token,
+                                             created_at=datetime.now(pytz.utc),
+                                             local_time=dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                             expired_at=datetime.now(pytz.utc) + dt.timedelta(days=1))
 
                         response = {"status": 'success', "data": user, "message": "Login successful"}
                         stop_and_check_mongo_status(conn)
@@ -263,13 +253,12 @@ class FetchRegion(MethodView):
                 country = data["country"]
                 emp_assign = data["emp_assign"]
 
+                page = parse_page(data)
+
                 if country and emp_assign:
-                    find_region = db1.find(
-                        {"status": "active", "type_id": "region", "country": country, "emp_assign": emp_assign},
-                        {"location": 1, "emp_id": 1, "employee": 1})
-                    find_region_list = list(find_region)
-                    total_region = db1.count_documents(
-                        {"status": "active", "type_id": "region", "country": country, "emp_assign": emp_assign})
+                    find_region_list, total_region, page_info = find_page(
+                        db1, {"status": "active", "type_id": "region", "country": country, "emp_assign": emp_assign},
+                        {"location": 1, "emp_id": 1, "employee": 1}, None, page)
 
                     if total_region != 0:
                         for i in find_region_list:
@@ -278,6 +267,8 @@ class FetchRegion(MethodView):
                                     "total_region": total_region, "message": "all region "
                                                                              "fetched "
                                                                              "successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
 
@@ -287,12 +278,9 @@ class FetchRegion(MethodView):
                         return make_response(jsonify(response)), 400
 
                 if country and emp_assign is None or emp_assign == "":
-                    find_region = db1.find(
-                        {"status": "active", "type_id": "region", "country": country},
-                        {"location": 1, "emp_id": 1, "employee": 1})
-                    find_region_list = list(find_region)
-                    total_region = db1.count_documents(
-                        {"status": "active", "type_id": "region", "country": country})
+                    find_region_list, total_region, page_info = find_page(
+                        db1, {"status": "active", "type_id": "region", "country": country},
+                        {"location": 1, "emp_id": 1, "employee": 1}, None, page)
 
                     if total_region != 0:
                         for i in find_region_list:
@@ -301,6 +289,8 @@ class FetchRegion(MethodView):
                                     "total_region": total_region, "message": "all region "
                                                                              "fetched "
                                                                              "successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
 
@@ -319,6 +309,11 @@ class FetchRegion(MethodView):
                 stop_and_check_mongo_status(conn)
                 return make_response(jsonify(response)), 400
 
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -338,12 +333,13 @@ class FetchCountry(MethodView):
                 data = request.get_json()
                 emp_assign = data["emp_assign"]
 
+                page = parse_page(data)
+
                 if emp_assign:
-                    find_location = db1.find({"status": "active", "type_id": "country", "emp_assign": emp_assign},
-                                             {"location": 1})
-                    find_location_list = list(find_location)
-                    total_location = db1.count_documents(
-                        {"status": "active", "type_id": "country", "emp_assign": emp_assign})
+                    find_location_list, status_counts, page_info = find_with_counts(
+                        db1, {"status": "active", "type_id": "country", "emp_assign": emp_assign}, {"location": 1},
+                        None, page)
+                    total_location = count_total(status_counts)
 
                     if total_location != 0:
                         for i in find_location_list:
@@ -352,6 +348,8 @@ class FetchCountry(MethodView):
                                     "message": "Location "
                                                "fetched "
                                                "successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
                     else:
@@ -360,11 +358,9 @@ class FetchCountry(MethodView):
                         return make_response(jsonify(response)), 400
 
                 if emp_assign is None or emp_assign == "":
-                    find_location = db1.find({"status": "active", "type_id": "country"},
-                                             {"location": 1})
-                    find_location_list = list(find_location)
-                    total_location = db1.count_documents(
-                        {"status": "active", "type_id": "country"})
+                    find_location_list, status_counts, page_info = find_with_counts(
+                        db1, {"status": "active", "type_id": "country"}, {"location": 1}, None, page)
+                    total_location = count_total(status_counts)
 
                     if total_location != 0:
                         for i in find_location_list:
@@ -373,6 +369,8 @@ class FetchCountry(MethodView):
                                     "message": "Location "
                                                "fetched "
                                                "successfully"}
+                        if page_info:
+                            response["page"] = page_info
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 200
                     else:
@@ -390,6 +388,11 @@ class FetchCountry(MethodView):
                 stop_and_check_mongo_status(conn)
                 return make_response(jsonify(response)), 400
 
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -0,0 +1,211 @@
+"""
+In-process metrics exposed in the Prometheus text format on ``GET /metrics``.
+
+The endpoint is only registered with ``METRICS_ENABLED``, and it reveals per-collection and S3 traffic, so set
+``METRICS_TOKEN`` (sent as a bearer token) or keep it unreachable from outside.
+
+Counters and histograms are kept per worker process; with several gunicorn workers each scrape sees the worker
+that answered it, so scrape the workers directly rather than through the load balancer.
+"""
+import bisect
+import hmac
+import threading
+import time
+
+from flask import current_app, g, request
+from pymongo import monitoring
+
+from db_connection import mongo_pool
+from settings.configuration import s3_client_hooks
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+THROUGHPUT_BUCKETS = (64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "grain_http_request_duration_seconds", "Time spent handling a request.", ("endpoint", "method", "status"))
+mongo_command_seconds = registry.histogram(
+    "grain_mongo_command_duration_seconds", "MongoDB command latency.", ("collection", "command"))
+mongo_command_failures = registry.counter(
+    "grain_mongo_command_failures_total", "MongoDB commands that returned an error.", ("collection", "command"))
+s3_request_seconds = registry.histogram(
+    "grain_s3_request_duration_seconds", "S3 API call latency, per operation.", ("operation",))
+upload_bytes = registry.counter(
+    "grain_upload_bytes_total", "Bytes sent to S3 by content uploads.", ("type_id",))
+upload_files = registry.counter(
+    "grain_upload_files_total", "Files handled by content uploads; result is uploaded or deduplicated.",
+    ("type_id", "result"))
+upload_seconds = registry.histogram(
+    "grain_upload_duration_seconds", "Time to upload one file to S3.", ("type_id",))
+upload_throughput = registry.histogram(
+    "grain_upload_throughput_bytes_per_second", "Per-file upload throughput.", ("type_id",),
+    buckets=THROUGHPUT_BUCKETS)
+
+
+def record_upload(type_id, size, seconds):
+    upload_files.inc(type_id=type_id, result="uploaded")
+    upload_bytes.inc(size, type_id=type_id)
+    upload_seconds.observe(seconds, type_id=type_id)
+    if seconds > 0:
+        upload_throughput.observe(size / seconds, type_id=type_id)
+
+
+def command_collection(event):
+    # The collection is the value of the command's first key, except for getMore (whose value is the cursor id)
+    if event.command_name == "getMore":
+        return event.command.get("collection", "")
+    collection = event.command.get(event.command_name)
+    return collection if isinstance(collection, str) else ""
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command per collection and command name."""
+
+    def __init__(self):
+        self._started = {}
+
+    def started(self, event):
+        self._started[(event.connection_id, event.request_id)] = command_collection(event)
+
+    def succeeded(self, event):
+        collection = self._started.pop((event.connection_id, event.request_id), "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, collection=collection,
+                                      command=event.command_name)
+
+    def failed(self, event):
+        collection = self._started.pop((event.connection_id, event.request_id), "")
+        mongo_command_seconds.observe(event.duration_micros / 1e6, collection=collection,
+                                      command=event.command_name)
+        mongo_command_failures.inc(collection=collection, command=event.command_name)
+
+
+mongo_command_metrics = MongoCommandMetrics()
+
+
+def instrument_s3_client(client):
+    # botocore passes the same per-call context dict to before-call and after-call
+    def before_call(context, **kwargs):
+        context["metrics_started_at"] = time.perf_counter()
+
+    def after_call(model, context, **kwargs):
+        started_at = context.pop("metrics_started_at", None)
+        if started_at is not None:
+            s3_request_seconds.observe(time.perf_counter() - started_at, operation=model.name)
+
+    client.meta.events.register("before-call.s3", before_call)
+    client.meta.events.register("after-call.s3", after_call)
+
+
+def init_app(app):
+    mongo_pool.add_event_listener(mongo_command_metrics)
+    if instrument_s3_client not in s3_client_hooks:
+        s3_client_hooks.append(instrument_s3_client)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started_at = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started_at = g.pop("metrics_started_at", None)
+        if started_at is not None:
+            http_request_seconds.observe(time.perf_counter() - started_at, endpoint=request.endpoint or "",
+                                         method=request.method, status=response.status_code)
+        return response
+
+    if app.config.get("METRICS_ENABLED", False):
+        app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
+
+
+def metrics_view():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return current_app.response_class("Unauthorized\n", status=401, mimetype="text/plain")
+    return current_app.response_class(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,168 @@
+"""
+Opt-in per-request profiling.
+
+With ``PROFILING_MODE = "header"`` a request sending ``X-Profile: 1`` is profiled; with ``"always"`` every
+request is. A profiled response carries a ``Server-Timing`` header with the time spent in MongoDB (and the
+number of commands, overall and per collection), S3, marshmallow validation, JSON serialization and in total.
+A ``PROFILE_SAMPLE_RATE`` share of profiled requests is also run under cProfile and dumped to ``PROFILE_DIR``
+(open the files with ``python -m pstats`` or snakeviz).
+
+Only work done on the request thread is attributed to the request: MongoDB calls made from the upload thread
+pools are not counted, and S3 time is the wall-clock time of the outermost ``S3Uploader`` call.
+"""
+import cProfile
+import datetime as dt
+import os
+import random
+import tempfile
+import threading
+import time
+from functools import wraps
+
+import marshmallow
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from pymongo import monitoring
+
+from app import metrics
+from db_connection import mongo_pool
+
+mongo_commands_per_request = metrics.registry.histogram(
+    "grain_request_mongo_commands", "MongoDB commands issued by one profiled request.", ("endpoint",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.collections = {}
+        self.sections = {}
+        self._depth = {}
+        self._lock = threading.Lock()
+
+    def add_command(self, collection, seconds):
+        with self._lock:
+            self.mongo_commands += 1
+            self.mongo_seconds += seconds
+            count, total = self.collections.get(collection, (0, 0.0))
+            self.collections[collection] = (count + 1, total + seconds)
+
+    def enter(self, section):
+        # Nested calls of the same section (upload_files -> upload_file) are only timed once
+        self._depth[section] = self._depth.get(section, 0) + 1
+        return self._depth[section] == 1
+
+    def leave(self, section, seconds):
+        self._depth[section] -= 1
+        if seconds is not None:
+            with self._lock:
+                self.sections[section] = self.sections.get(section, 0.0) + seconds
+
+    def server_timing(self):
+        entries = [f'mongo;dur={self.mongo_seconds * 1000:.2f};desc="{self.mongo_commands} commands"']
+        for collection, (count, seconds) in sorted(self.collections.items()):
+            entries.append(f'mongo-{collection or "admin"};dur={seconds * 1000:.2f};desc="{count} commands"')
+        for section in ("s3", "validation", "json"):
+            entries.append(f"{section};dur={self.sections.get(section, 0.0) * 1000:.2f}")
+        entries.append(f"total;dur={(time.perf_counter() - self.started_at) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+def current_profile():
+    if has_request_context():
+        return g.get("profile")
+    return None
+
+
+def profiled(section):
+    """Attribute the wrapped call's wall-clock time to ``section`` of the current request's profile."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = current_profile()
+            if profile is None:
+                return function(*args, **kwargs)
+            outermost = profile.enter(section)
+            started_at = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.leave(section, time.perf_counter() - started_at if outermost else None)
+
+        return wrapper
+
+    return decorator
+
+
+class MongoCommandProfiler(monitoring.CommandListener):
+    """pymongo publishes command events on the thread that runs the command, i.e. the request's thread."""
+
+    def __init__(self):
+        self._started = {}
+
+    def started(self, event):
+        profile = current_profile()
+        if profile is not None:
+            self._started[(event.connection_id, event.request_id)] = (profile, metrics.command_collection(event))
+
+    def succeeded(self, event):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is not None:
+            started[0].add_command(started[1], event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+mongo_command_profiler = MongoCommandProfiler()
+
+
+class ProfiledSchema(marshmallow.Schema):
+    """Base class of the app's schemas, so their ``load`` counts as validation time in a profiled request."""
+
+    @profiled("validation")
+    def load(self, *args, **kwargs):
+        return super().load(*args, **kwargs)
+
+
+class ProfilingJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        return profiled("json")(super().dumps)(obj, **kwargs)
+
+
+def init_app(app):
+    mode = app.config.get("PROFILING_MODE", "off")
+    if mode not in ("header", "always"):
+        return
+    header = app.config.get("PROFILING_HEADER", "X-Profile")
+    sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    profile_dir = app.config.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "grain-profiles")
+
+    mongo_pool.add_event_listener(mongo_command_profiler)
+    app.json = ProfilingJSONProvider(app)
+
+    @app.before_request
+    def start_profile():
+        if mode == "always" or request.headers.get(header, "").lower() in ("1", "true", "yes"):
+            g.profile = RequestProfile()
+            if sample_rate and random.random() < sample_rate:
+                g.cprofile = cProfile.Profile()
+                g.cprofile.enable()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        profiler = g.pop("cprofile", None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            name = f"{dt.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.endpoint or 'unknown'}.prof"
+            profiler.dump_stats(os.path.join(profile_dir, name))
+        response.headers["Server-Timing"] = profile.server_timing()
+        mongo_commands_per_request.observe(profile.mongo_commands, endpoint=request.endpoint or "")
+        return response
@@ -0,0 +1,224 @@
+import base64
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from db_indexes import CASE_INSENSITIVE
+
+PAGE_MAX_LIMIT = 500
+
+
+class PageError(ValueError):
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.messages = {field: [message]}
+
+
+def encode_cursor(sort_key, sort_value, _id):
+    raw = json.dumps([sort_key, sort_value, str(_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort_key):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_key, sort_value, _id = json.loads(raw)
+        _id = ObjectId(_id)
+    except (TypeError, ValueError, InvalidId):
+        raise PageError("after", "Invalid cursor")
+    # A cursor only makes sense for the ordering it was issued for
+    if cursor_key != sort_key:
+        raise PageError("after", "Invalid cursor")
+    return sort_value, _id
+
+
+def parse_page(data):
+    """
+    Read the opt-in paging parameters from a request body.
+
+    Returns ``None`` when the client did not send ``limit`` (the legacy, unpaged response), otherwise
+    ``{"limit", "after", "total"}``.
+    """
+    if not data or data.get("limit") in (None, ""):
+        return None
+    try:
+        limit = int(data["limit"])
+    except (TypeError, ValueError):
+        raise PageError("limit", "Limit must be a number")
+    if not 1 <= limit <= PAGE_MAX_LIMIT:
+        raise PageError("limit", f"Limit must be between 1 and {PAGE_MAX_LIMIT}")
+    return {"limit": limit, "after": data.get("after") or None, "total": bool(data.get("total"))}
+
+
+def keyset_filter(sort_key, sort_value, _id):
+    # Documents strictly after (sort_value, _id) in ascending (sort_key, _id) order; missing/null sort first
+    if sort_key == "_id":
+        return {"_id": {"$gt": _id}}
+    if sort_value is None:
+        return {"$or": [{sort_key: None, "_id": {"$gt": _id}}, {sort_key: {"$ne": None}}]}
+    return {"$or": [{sort_key: {"$gt": sort_value}}, {sort_key: sort_value, "_id": {"$gt": _id}}]}
+
+
+def find_page(collection, query, projection, sort_key, page, count_query=None, count=True):
+    """
+    Run a list query either unpaged or as one keyset page.
+
+    Unpaged (``page is None``) returns the whole result set sorted on ``sort_key`` (insertion order when it is
+    ``None``), as the endpoints always have. Paged returns at most ``page["limit"]`` documents after the
+    ``page["after"]`` cursor, ordered on ``(sort_key, _id)`` so the order is total and resumable.
+
+    Returns ``(documents, total, page_info)``. ``total`` is ``count_documents(count_query)``, counted when the
+    client asked for it or, for unpaged requests, unless ``count`` is false; otherwise it is ``None``.
+    """
+    count_query = query if count_query is None else count_query
+
+    if page is None:
+        cursor = collection.find(query, projection)
+        if sort_key:
+            cursor = cursor.sort(sort_key, 1)
+        return list(cursor), collection.count_documents(count_query) if count else None, None
+
+    filter_, projection, sort, hidden_key = _keyset_bounds(query, projection, sort_key, page)
+    documents = list(collection.find(filter_, projection).sort(sort).limit(page["limit"] + 1))
+    documents, page_info = _finish_page(documents, sort[0][0], page, hidden_key)
+
+    total = collection.count_documents(count_query) if page["total"] else None
+    return documents, total, page_info
+
+
+def find_with_counts(collection, query, projection, sort_key, page):
+    """
+    Same listing as ``find_page``, plus the number of matches per ``status``.
+
+    The documents come from ``find_page``, an index-backed sorted find. The counts are a separate ``$match`` +
+    ``$group`` over ``query``, which the ``(type_id, status, ...)`` indexes cover, and only run when needed.
+
+    Returns ``(documents, status_counts, page_info)``. ``status_counts`` (``{status: n}`` over the whole
+    ``query``) is computed for unpaged requests and for pages that asked for a total; otherwise it is ``None``.
+    """
+    # The per-status counts replace find_page's own total
+    documents, _, page_info = find_page(collection, query, projection, sort_key,
+                                        page and {**page, "total": False}, count=False)
+    if page is not None and not page["total"]:
+        return documents, None, page_info
+
+    status_counts = {row["_id"]: row["count"] for row in
+                     collection.aggregate([{"$match": query}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}])}
+    return documents, status_counts, page_info
+
+
+def count_total(status_counts, *statuses):
+    # Total over the given statuses (all of them when none are given); None when the counts were not computed
+    if status_counts is None:
+        return None
+    if not statuses:
+        return sum(status_counts.values())
+    return sum(status_counts.get(status, 0) for status in statuses)
+
+
+def _keyset_bounds(query, projection, sort_key, page):
+    sort_key = sort_key or "_id"
+    filter_ = query
+    if page["after"]:
+        sort_value, after_id = decode_cursor(page["after"], sort_key)
+        filter_ = {"$and": [query, keyset_filter(sort_key, sort_value, after_id)]}
+
+    # The cursor needs the sort value even when an inclusion projection leaves it out of the response
+    hidden_key = bool(projection and sort_key != "_id" and sort_key not in projection
+                      and any(projection.values()))
+    if hidden_key:
+        projection = {**projection, sort_key: 1}
+
+    sort = [(sort_key, 1)] if sort_key == "_id" else [(sort_key, 1), ("_id", 1)]
+    return filter_, projection, sort, hidden_key
+
+
+def _finish_page(documents, sort_key, page, hidden_key):
+    has_more = len(documents) > page["limit"]
+    documents = documents[:page["limit"]]
+
+    next_cursor = None
+    if has_more:
+        last = documents[-1]
+        next_cursor = encode_cursor(sort_key, last.get(sort_key) if sort_key != "_id" else None, last["_id"])
+    if hidden_key:
+        for document in documents:
+            document.pop(sort_key, None)
+    return documents, {"limit": page["limit"], "next_cursor": next_cursor, "has_more": has_more}
+
+
+def distinct_page(collection, query, group_key, projection, page):
+    """
+    One keyset page of the last matching document per distinct ``group_key`` value, ordered on that value.
+
+    Returns ``(documents, total, page_info)`` like ``find_page``; ``total`` counts the distinct values and is only
+    computed when the client asked for it.
+    """
+    # Sorting first makes the document kept per group deterministic (the newest _id), so pages stay stable
+    pipeline = [{"$match": query}, {"$sort": {group_key: 1, "_id": 1}},
+                {"$group": {"_id": "$" + group_key, "doc": {"$last": "$$ROOT"}}}]
+    if page["after"]:
+        after_value, _ = decode_cursor(page["after"], group_key)
+        pipeline.append({"$match": {"_id": {"$gt": after_value}}})
+    pipeline += [{"$sort": {"_id": 1}}, {"$limit": page["limit"] + 1},
+                 {"$replaceRoot": {"newRoot": "$doc"}}, {"$project": projection}]
+
+    documents = list(collection.aggregate(pipeline))
+    has_more = len(documents) > page["limit"]
+    documents = documents[:page["limit"]]
+    next_cursor = encode_cursor(group_key, documents[-1].get(group_key), documents[-1]["_id"]) if has_more else None
+
+    total = None
+    if page["total"]:
+        counted = list(collection.aggregate([{"$match": query}, {"$group": {"_id": "$" + group_key}},
+                                             {"$count": "total"}]))
+        total = counted[0]["total"] if counted else 0
+    return documents, total, {"limit": page["limit"], "next_cursor": next_cursor, "has_more": has_more}
+
+
+def find_by_email(collection, email_id, **filters):
+    # Served by the case-insensitive email_id index; an anchored /i regex cannot use any index
+    return collection.find_one({"email_id": email_id, **filters}, collation=CASE_INSENSITIVE)
+
+
+def find_conflicts(db, checks):
+    """
+    Run several "does a document like this exist?" checks in one round trip and return the names of those that
+    matched.
+
+    ``checks`` is a list of ``(name, collection, filter, exact)``; filters are plain field equalities. Every check
+    is its own branch of one aggregation (the first runs on its collection, the rest are pulled in with
+    ``$unionWith``), and the whole pipeline runs with the case-insensitive collation, so each branch is served by
+    the email/name indexes. A check without ``exact`` stops at its first match; checks with ``exact`` set get all
+    their case-insensitive matches back and are re-compared case-sensitively here.
+    """
+    branches = []
+    for index, (name, collection, filter_, exact) in enumerate(checks):
+        branch = [{"$match": filter_}]
+        if not exact:
+            branch.append({"$limit": 1})
+        branch += [{"$project": {field: 1 for field in filter_}}, {"$addFields": {"_check": index}}]
+        branches.append((collection, branch))
+
+    (first, pipeline), others = branches[0], branches[1:]
+    pipeline = pipeline + [{"$unionWith": {"coll": collection, "pipeline": branch}} for collection, branch in others]
+    documents = list(db[first].aggregate(pipeline, collation=CASE_INSENSITIVE))
+
+    found = set()
+    for document in documents:
+        name, _, filter_, exact = checks[document["_check"]]
+        if _same_values(document, filter_, exact):
+            found.add(name)
+    return found
+
+
+def _same_values(document, filter_, exact):
+    for field, value in filter_.items():
+        stored = document.get(field)
+        if not exact and isinstance(value, str) and isinstance(stored, str):
+            if stored.casefold() != value.casefold():
+                return False
+        elif stored != value:
+            return False
+    return True
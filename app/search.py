@@ -0,0 +1,356 @@
+"""
+Search: variant names (``SearchIndex``) and approved content text (``ContentSearch``).
+
+Name search is backed by keys stored on each document when it is written.
+
+For a name like "Gobindo Bhog" the document gets ``search_keys`` holding, per normalized token, the token itself
+(``t:gobindo``), its prefixes (``p:g``, ``p:go``, ...) and its trigrams (``g:^go``, ``g:gob``, ...). A search is
+then an indexed ``$all`` over prefix keys, with a trigram ``$in`` fallback for misspellings; candidates are few
+and bounded, and are ranked in Python (exact token > prefix > fuzzy, shorter names first).
+
+Content search uses a MongoDB text index over ``search_title``/``search_text``, fields that are filled in when
+content is approved and removed when it leaves that state.
+
+Documents written before these fields existed are filled in with ``flask --app main search reindex``.
+"""
+import time
+import unicodedata
+
+import click
+from flask.cli import AppGroup
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import ExecutionTimeout
+
+from app import metrics
+from app.identity_map import find_one, updated
+from app.queries import PageError, encode_cursor, decode_cursor
+from db_indexes import ensure_required_indexes
+
+PREFIX_MAX = 12
+MAX_QUERY_TOKENS = 5
+MAX_TOKEN_LENGTH = 32
+CANDIDATES = 200
+FUZZY_THRESHOLD = 0.4
+MAX_TIME_MS = 50
+
+search_seconds = metrics.registry.histogram(
+    "grain_search_duration_seconds", "Server time of a name search, per phase.", ("index", "phase"))
+content_search_seconds = metrics.registry.histogram(
+    "grain_content_search_duration_seconds", "Server time of a content text search.")
+
+
+def normalize(text):
+    """Case-folded tokens; accents are dropped from Latin letters, other scripts are kept as they are."""
+    folded = []
+    for char in unicodedata.normalize("NFKD", str(text or "").casefold()):
+        if unicodedata.combining(char) and folded and folded[-1].isascii():
+            continue
+        folded.append(char)
+    # Letters, digits and combining marks (vowel signs in Bengali, Devanagari, ...) make up tokens
+    text = "".join(char if char.isalnum() or unicodedata.category(char).startswith("M") else " "
+                   for char in unicodedata.normalize("NFC", "".join(folded)))
+    return text.split()
+
+
+def trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(left, right):
+    # Dice coefficient over trigrams: 1.0 for equal tokens, 0 for nothing in common
+    a, b = trigrams(left), trigrams(right)
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def search_keys(*names):
+    keys = set()
+    for name in names:
+        for token in normalize(name):
+            token = token[:MAX_TOKEN_LENGTH]
+            keys.add("t:" + token)
+            keys.update("p:" + token[:n] for n in range(1, min(len(token), PREFIX_MAX) + 1))
+            keys.update("g:" + gram for gram in trigrams(token))
+    return sorted(keys)
+
+
+def score(query_tokens, name, fuzzy):
+    """Relevance of ``name`` for the query, or 0 when some query token matches nothing in it."""
+    name_tokens = normalize(name)
+    if not name_tokens:
+        return 0
+    total = 0.0
+    for query_token in query_tokens:
+        best = 0.0
+        for token in name_tokens:
+            if token == query_token:
+                best = 3.0
+                break
+            if token.startswith(query_token):
+                best = max(best, 2.0)
+            elif fuzzy:
+                match = similarity(query_token, token)
+                if match >= FUZZY_THRESHOLD:
+                    best = max(best, match)
+        if not best:
+            return 0
+        total += best
+    if name_tokens == query_tokens:
+        total += 5
+    return total
+
+
+class SearchIndex:
+    """Search over ``field`` of the documents in one collection; keys live in ``key_field``."""
+
+    def __init__(self, name, collection, field, key_field="search_keys"):
+        self.name = name
+        self.collection = collection
+        self.field = field
+        self.key_field = key_field
+
+    def keys(self, value):
+        return search_keys(value)
+
+    def with_keys(self, values):
+        """
+        Add the keys to an inserted document or a ``$set`` when it writes ``field``. Every write that sets
+        ``field`` must go through this, or the document drops out of the search.
+        """
+        if self.field in values:
+            values[self.key_field] = self.keys(values[self.field])
+        return values
+
+    def search(self, db, text, scope, projection, limit=20):
+        """
+        Ranked documents matching ``text`` within ``scope`` (an ordinary filter), at most ``limit`` of them.
+
+        Returns ``(documents, has_more)``. Each phase reads at most ``CANDIDATES`` documents and is cut off by the
+        server after ``MAX_TIME_MS``.
+        """
+        query_tokens = [token[:MAX_TOKEN_LENGTH] for token in normalize(text)][:MAX_QUERY_TOKENS]
+        if not query_tokens:
+            return [], False
+        collection = db[self.collection]
+        projection = {**projection, self.field: 1}
+
+        started_at = time.perf_counter()
+        prefixes = ["p:" + token[:PREFIX_MAX] for token in query_tokens]
+        candidates = self._candidates(collection, {**scope, self.key_field: {"$all": prefixes}}, projection)
+        ranked = self._rank(candidates, query_tokens, fuzzy=False)
+        search_seconds.observe(time.perf_counter() - started_at, index=self.name, phase="prefix")
+
+        if len(ranked) < limit:
+            started_at = time.perf_counter()
+            seen = [document["_id"] for _, document in ranked]
+            grams = sorted({"g:" + gram for token in query_tokens for gram in trigrams(token)})
+            candidates = self._candidates(
+                collection, {**scope, "_id": {"$nin": seen}, self.key_field: {"$in": grams}}, projection)
+            ranked += self._rank(candidates, query_tokens, fuzzy=True)
+            search_seconds.observe(time.perf_counter() - started_at, index=self.name, phase="fuzzy")
+
+        ranked.sort(key=lambda item: (-item[0], len(str(item[1].get(self.field, ""))),
+                                      str(item[1].get(self.field, ""))))
+        return [document for _, document in ranked[:limit]], len(ranked) > limit
+
+    def _candidates(self, collection, query, projection):
+        # A phase that runs out of time contributes nothing rather than failing the whole search
+        try:
+            return list(collection.find(query, projection).limit(CANDIDATES).max_time_ms(MAX_TIME_MS))
+        except ExecutionTimeout:
+            return []
+
+    def _rank(self, candidates, query_tokens, fuzzy):
+        ranked = []
+        for document in candidates:
+            relevance = score(query_tokens, document.get(self.field), fuzzy)
+            if relevance:
+                ranked.append((relevance, document))
+        return ranked
+
+    def reindex(self, db, query=None, batch_size=500):
+        """(Re)compute the keys of every document matching ``query``; returns the number of documents updated."""
+        collection = db[self.collection]
+        updated = 0
+        batch = []
+        for document in collection.find(query or {}, {self.field: 1}):
+            batch.append(UpdateOne({"_id": document["_id"]},
+                                   {"$set": {self.key_field: self.keys(document.get(self.field))}}))
+            if len(batch) >= batch_size:
+                updated += collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+        return updated
+
+
+variant_search = SearchIndex("grain_variant", "grain_assign", "grain_variant")
+
+
+# Fields of a content document that are not searchable text (pictures are stored as dicts and skipped anyway)
+CONTENT_META_FIELDS = {"_id", "g_v_id", "status", "type_id", "created_at", "updated_at", "remarks", "upload_job_id",
+                       "search_title", "search_text", "eco_region_link"}
+# The free text is put first so snippets usually come from it
+CONTENT_LEADING_FIELDS = ("story", "culinary", "er_details", "conserved_by", "sources")
+CONTENT_TYPE_LABELS = {"story": "Story", "culinary": "Culinary", "agronomy": "Agronomy", "eco_region": "Eco Region",
+                       "pre_harvest_morphology": "Pre Harvest Morphology",
+                       "post_harvest_morphology": "Post Harvest Morphology"}
+SNIPPET_LENGTH = 160
+MAX_SEARCH_OFFSET = 500
+
+
+def _strings(value):
+    if isinstance(value, str):
+        if not value.startswith(("http://", "https://")):
+            yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _strings(item)
+    elif isinstance(value, dict) and "file_url" not in value:
+        for item in value.values():
+            yield from _strings(item)
+
+
+def content_text(content):
+    fields = [field for field in CONTENT_LEADING_FIELDS if field in content]
+    fields += [field for field in content if field not in CONTENT_LEADING_FIELDS]
+    parts = []
+    for field in fields:
+        if field in CONTENT_META_FIELDS:
+            continue
+        parts.extend(text.strip() for text in _strings(content[field]) if text.strip())
+    return "\n".join(parts)
+
+
+def snippet(text, terms, length=SNIPPET_LENGTH):
+    """About ``length`` characters of ``text`` around the first query term found in it."""
+    lowered = text.casefold()
+    positions = [lowered.find(term) for term in terms if term and lowered.find(term) >= 0]
+    start = max(0, min(positions) - length // 3) if positions else 0
+    end = min(len(text), start + length)
+    excerpt = " ".join(text[start:end].split())
+    return ("..." if start else "") + excerpt + ("..." if end < len(text) else "")
+
+
+class ContentSearch:
+    """Ranked text search over approved content, kept current by ``content_approval_update``."""
+
+    def fields(self, content, variant):
+        # search_title is weighted above the body in the text index (see db_indexes)
+        title = " ".join(str(part) for part in (CONTENT_TYPE_LABELS.get(content.get("type_id"), ""),
+                                                 (variant or {}).get("grain"), (variant or {}).get("grain_variant"))
+                         if part)
+        return {"search_title": title, "search_text": content_text(content)}
+
+    def update(self, db, content_id, status):
+        """Index the content when it becomes approved, drop it from the index otherwise."""
+        contents = db["content"]
+        if status != "approve":
+            contents.update_one({"_id": content_id}, {"$unset": {"search_title": "", "search_text": ""}})
+            updated(contents, content_id)
+            return
+        content = find_one(contents, {"_id": content_id})
+        if content is None:
+            return
+        variant = self._variant(db, content.get("g_v_id"))
+        fields = self.fields(content, variant)
+        contents.update_one({"_id": content_id}, {"$set": fields})
+        updated(contents, content_id, fields)
+
+    def _variant(self, db, g_v_id):
+        try:
+            return find_one(db["grain_assign"], {"_id": ObjectId(g_v_id)}, {"grain": 1, "grain_variant": 1})
+        except (InvalidId, TypeError):
+            return None
+
+    def search(self, db, text, page):
+        """
+        One page of approved content matching ``text``, best match first.
+
+        ``page`` comes from ``parse_page``; its cursor carries the offset of the next page. Returns
+        ``(results, total, page_info)``; ``total`` is only counted when asked for.
+        """
+        # $text fails outright without the text index
+        ensure_required_indexes(db, "content")
+        started_at = time.perf_counter()
+        query = {"$text": {"$search": str(text)}, "status": "approve"}
+        offset = 0
+        if page["after"]:
+            offset, _ = decode_cursor(page["after"], "text_offset")
+            if not isinstance(offset, int) or not 0 <= offset <= MAX_SEARCH_OFFSET:
+                raise PageError("after", "Invalid cursor")
+
+        score = {"score": {"$meta": "textScore"}}
+        documents = list(db["content"].find(query, {**score, "g_v_id": 1, "type_id": 1, "search_title": 1,
+                                                    "search_text": 1})
+                         .sort([("score", {"$meta": "textScore"}), ("_id", 1)])
+                         .skip(offset).limit(page["limit"] + 1))
+        has_more = len(documents) > page["limit"] and offset + page["limit"] < MAX_SEARCH_OFFSET
+        documents = documents[:page["limit"]]
+        active = self._active_variants(db, [document.get("g_v_id") for document in documents])
+
+        terms = normalize(text)
+        results = []
+        for document in documents:
+            if document.get("g_v_id") not in active:
+                continue
+            variant = active[document["g_v_id"]]
+            results.append({
+                "content_id": str(document["_id"]),
+                "g_v_id": document["g_v_id"],
+                "type_id": document.get("type_id"),
+                "grain": variant.get("grain"),
+                "grain_variant": variant.get("grain_variant"),
+                "score": round(document["score"], 3),
+                "snippet": snippet(document.get("search_text", ""), terms),
+            })
+
+        total = db["content"].count_documents(query) if page["total"] else None
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor("text_offset", offset + page["limit"], documents[-1]["_id"])
+        content_search_seconds.observe(time.perf_counter() - started_at)
+        return results, total, {"limit": page["limit"], "next_cursor": next_cursor, "has_more": has_more}
+
+    def _active_variants(self, db, g_v_ids):
+        # Content of variants that were deactivated or are not approved any more is left out
+        ids = []
+        for g_v_id in set(g_v_ids):
+            try:
+                ids.append(ObjectId(g_v_id))
+            except (InvalidId, TypeError):
+                continue
+        variants = db["grain_assign"].find({"_id": {"$in": ids}, "status": "active",
+                                            "approve_status": {"$nin": ["pending"]}},
+                                           {"grain": 1, "grain_variant": 1})
+        return {str(variant["_id"]): variant for variant in variants}
+
+    def reindex(self, db):
+        updated = 0
+        for content in db["content"].find({"status": "approve"}, {"_id": 1}):
+            self.update(db, content["_id"], "approve")
+            updated += 1
+        db["content"].update_many({"status": {"$ne": "approve"}, "search_text": {"$exists": True}},
+                                  {"$unset": {"search_title": "", "search_text": ""}})
+        return updated
+
+
+content_search = ContentSearch()
+
+search_cli = AppGroup("search", help="Maintain the name search keys.")
+
+
+@search_cli.command("reindex")
+def reindex_command():
+    from db_connection import database_connect_mongo
+
+    updated = variant_search.reindex(database_connect_mongo(), {"type_id": "grain_variant_assign"})
+    click.echo(f"grain_variant: {updated} documents updated")
+    updated = content_search.reindex(database_connect_mongo())
+    click.echo(f"content: {updated} approved documents indexed")
+
+
+def init_app(app):
+    app.cli.add_command(search_cli)
@@ -1,6 +1,8 @@
-from marshmallow import Schema, fields, ValidationError, validates_schema
+from marshmallow import fields, ValidationError, post_load
 from passlib.handlers.pbkdf2 import pbkdf2_sha256
 
+from app.profiling import ProfiledSchema
+from app.queries import find_by_email
 from db_connection import database_connect_mongo
 
 ALPHABET_ERROR_MESSAGE = "Please enter alphabet only for name field"
@@ -8,20 +10,23 @@ name_check = "^[a-zA-Z\s]*\S$"
 password_check = "^(?=.*[A-Za-z])(?=.*\d)(?=.*[@$!%*#?&])[A-Za-z\d@$!%*#?&]{8,}$"
 
 
-class SuperEmployeeLoginSchema(Schema):
+class SuperEmployeeLoginSchema(ProfiledSchema):
     email_id = fields.Email(required=True)
     password = fields.Str(required=True)
 
-    @validates_schema
-    def validate_login(self, data, **kwargs):
+    @post_load
+    def authenticate(self, data, **kwargs):
+        # Loading returns the account itself, so the view does not look it up again
         db = database_connect_mongo()
         db1 = db["super_location"]
-        location = db1.find_one({"email_id": {"$eq": data['email_id']}}, collation={"locale": "en", "strength": 2})
+        location = find_by_email(db1, data['email_id'], status="active")
 
         if location is not None:
             if not pbkdf2_sha256.verify(data['password'], location['password']):
                 raise ValidationError("Incorrect password")
 
+            return location
+
         else:
             raise ValidationError({"email_id": ["Email does not exist"]})
 
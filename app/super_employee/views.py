@@ -1,5 +1,4 @@
 import datetime as dt
-import re
 from datetime import datetime
 
 import jwt
@@ -15,6 +14,7 @@ from app.employee_access.employee_validation import employee_registration_schema
 from app.helpers import S3Uploader
 from app.location.location_validation import country_registration_schema
 from app.super_employee.super_employee_validation import super_employee_login_schema
+from app.token_store import super_employee_tokens
 from db_connection import start_and_check_mongo, database_connect_mongo, stop_and_check_mongo_status, conn
 from settings.configuration import S3Config
 
@@ -64,18 +64,13 @@ class SuperEmployeeRegistration(MethodView):
                         validated_data["type_id"] = "super_admin"
 
                         s3_config = S3Config()
-                        bucket_status, total_files, all_folders = s3_config.connect_to_s3()
                         s3_uploader = S3Uploader(s3_config)
                         file_url = s3_uploader.upload_file(profile_pic)
 
-                        if s3_uploader.check_existing_file(file_url['file_url'], type_id):
-                            response = {"message": "File already exist", "status": "val_error"}
-                            stop_and_check_mongo_status(conn)
-                            return make_response(jsonify(response)), 400
-
                         # Insert the data into the database
                         validated_data["profile_pic"] = file_url
-                        db1.insert_one(validated_data)
+                        with s3_uploader.release_on_error(validated_data):
+                            db1.insert_one(validated_data)
 
                         # Extract the _id value
                         validated_data["_id"] = str(validated_data["_id"])
@@ -188,9 +183,7 @@ class SuperLogin(MethodView):
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["super_location"]
-                db2 = db["login_token"]
                 db3 = db["super_employee"]
-                db2.create_index("expired_at", expireAfterSeconds=0)
                 data = request.get_json()
                 email_id = data["email_id"].lower()
                 password = data["password"]
@@ -201,19 +194,13 @@ class SuperLogin(MethodView):
 
                     # Validate the data using the schema
                     try:
-                        super_employee_login_schema.load(data)
+                        location = super_employee_login_schema.load(data)
                     except ValidationError as err:
                         response = {"message": err.messages, "status": "val_error"}
                         stop_and_check_mongo_status(conn)
                         return make_response(jsonify(response)), 400
 
                     else:
-                        # simpler version to do check {"email_id": {"$regex": "^" + value + "$", "$options": "i"}}{
-                        # "email_id": {"$regex": "^" + value + "$", "$options": "i"}}
-                        location = db1.find_one(
-                            {"$and": [{'email_id': re.compile("^" + re.escape(email_id) + "$", re.IGNORECASE)}],
-                             "status": "active"})
-
                         emp_id = location.get("s_e_id", "Employee not assign")
 
                         employee = db3.find_one({"_id": ObjectId(emp_id), "status": "active"})
@@ -224,9 +211,6 @@ class SuperLogin(MethodView):
                             stop_and_check_mongo_status(conn)
                             return make_response(jsonify(response)), 400
 
-                        # Delete the previous token if exists(only single token)
-                        db2.delete_many({"s_id": str(location["_id"])})
-
                         s_token = jwt.encode(
                             {'_id': str(location["_id"]),
                              'exp': datetime.now(pytz.utc) + dt.timedelta(days=1)},
@@ -240,13 +224,12 @@ class SuperLogin(MethodView):
                         location["employee_email"] = employee["email_id"]
                         location["employee_designation"] = employee["type_id"]
 
-                        # Save the token into the database
-                        db2.insert_one({"s_token": s_token, "s_id": str(location["_id"]),
-                                        "created_at": str(datetime.now(pytz.utc)),
-                                        # "created_at_dt": str(dt.datetime.utcnow()),
-                                        "timezone": str(datetime.now(pytz.utc).astimezone().tzinfo),
-                                        "local_time": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                                        "expired_at": datetime.now(pytz.utc) + dt.timedelta(days=1)})
+                        # Save the token into the database, replacing the previous one (only single token)
+                        super_employee_tokens.save(db, location["_id"], s_token,
+                                                   created_at=str(datetime.now(pytz.utc)),
+                                                   timezone=str(datetime.now(pytz.utc).astimezone().tzinfo),
+                                                   local_time=str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                                                   expired_at=datetime.now(pytz.utc) + dt.timedelta(days=1))
 
                         response = {"status": 'success', "data": location, "message": "Login successful"}
                         stop_and_check_mongo_status(conn)
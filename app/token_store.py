@@ -0,0 +1,24 @@
+from db_indexes import ensure_required_indexes
+
+
+class LoginTokenStore:
+    """
+    Keeps a single login token per account in ``login_token``.
+
+    A new login replaces the previous token with one upsert. Expired tokens are removed by the TTL index on
+    ``expired_at`` declared in db_indexes; the owner indexes are unique, so an account never holds two tokens.
+    """
+
+    def __init__(self, owner_field, token_field, collection="login_token"):
+        self.owner_field = owner_field
+        self.token_field = token_field
+        self.collection = collection
+
+    def save(self, db, owner_id, token, **fields):
+        ensure_required_indexes(db, self.collection)
+        document = {self.token_field: token, self.owner_field: owner_id, **fields}
+        return db[self.collection].replace_one({self.owner_field: owner_id}, document, upsert=True)
+
+
+employee_tokens = LoginTokenStore("e_id", "e_token")
+super_employee_tokens = LoginTokenStore("s_id", "s_token")
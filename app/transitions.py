@@ -0,0 +1,63 @@
+import datetime as dt
+
+from marshmallow import EXCLUDE, pre_load
+from pymongo import ReturnDocument
+
+from app.profiling import ProfiledSchema
+
+# Allowed status changes, current status -> statuses it may move to. "delete" is a soft delete and final.
+STATUS_TRANSITIONS = {
+    "active": ("inactive", "delete"),
+    "inactive": ("active", "delete"),
+    "delete": (),
+}
+# What a status change request may ask for; request schemas validate against this
+STATUSES = tuple(STATUS_TRANSITIONS)
+
+
+class StatusChangeSchema(ProfiledSchema):
+    """Base of the status change requests: ``status_field`` is matched case-insensitively against ``STATUSES``."""
+    status_field = None
+
+    class Meta:
+        unknown = EXCLUDE
+
+    @pre_load
+    def lower_status(self, data, **kwargs):
+        if isinstance(data, dict) and isinstance(data.get(self.status_field), str):
+            data = {**data, self.status_field: data[self.status_field].lower()}
+        return data
+
+
+class TransitionError(Exception):
+    """Why a status change did not apply: ``not_found``, ``deleted``, ``unchanged`` or ``not_allowed``."""
+
+    def __init__(self, reason, current=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.current = current
+
+
+def change_status(collection, query, status, transitions=STATUS_TRANSITIONS):
+    """
+    Move the document matching ``query`` to ``status`` with one conditional ``find_one_and_update`` and return
+    the updated document. The update only matches while the current status may still move to ``status``, so
+    two admins changing the same document cannot both apply. Only when nothing matched is the document read
+    again to raise the right ``TransitionError``.
+    """
+    sources = [current for current, targets in transitions.items() if status in targets]
+    document = collection.find_one_and_update(
+        {**query, "status": {"$in": sources}},
+        {"$set": {"status": status, "updated_at": str(dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}},
+        return_document=ReturnDocument.AFTER)
+    if document is not None:
+        return document
+
+    current = collection.find_one(query, {"status": 1})
+    if current is None:
+        raise TransitionError("not_found")
+    if current["status"] == "delete":
+        raise TransitionError("deleted", current["status"])
+    if current["status"] == status:
+        raise TransitionError("unchanged", current["status"])
+    raise TransitionError("not_allowed", current["status"])
@@ -0,0 +1,187 @@
+import datetime as dt
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytz
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import current_app, request
+from werkzeug.datastructures import FileStorage
+
+from app.helpers import S3Uploader
+from db_connection import database_connect_mongo
+from db_indexes import ensure_required_indexes
+from settings.configuration import S3Config
+
+
+def now():
+    return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class UploadQueue:
+    """
+    Background S3 transfer for content submissions.
+
+    ``submit`` spools the pictures to local disk, inserts the ``content`` document as ``status: uploading`` and
+    an ``upload_jobs`` document, and hands the transfer to a per-process thread pool. The worker uploads through
+    ``S3Uploader`` (same keys, dedup and rollback as the synchronous path), records per-file progress on the job
+    and flips the content to ``pending``. If the transfer fails the content is soft-deleted so it can be
+    submitted again.
+
+    Spooled files live on the worker's local disk, so a job interrupted by a restart is reported as ``running``
+    until its job document expires; the content stays ``uploading`` and has to be removed by hand.
+    """
+
+    def __init__(self, max_workers=4, progress_step=10, job_ttl=24 * 60 * 60):
+        self.max_workers = max_workers
+        self.progress_step = progress_step
+        self.job_ttl = job_ttl
+        self.spool_dir = os.path.join(tempfile.gettempdir(), "grain-uploads")
+        self.default_async = False
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_workers = app.config.get("UPLOAD_WORKERS", self.max_workers)
+        self.progress_step = app.config.get("UPLOAD_PROGRESS_STEP", self.progress_step)
+        self.job_ttl = app.config.get("UPLOAD_JOB_TTL", self.job_ttl)
+        self.spool_dir = app.config.get("UPLOAD_SPOOL_DIR") or self.spool_dir
+        self.default_async = app.config.get("ASYNC_UPLOADS", False)
+        app.extensions["upload_queue"] = self
+
+    def executor(self):
+        # One pool per process: threads do not survive a fork, so a forked worker builds its own
+        pid = os.getpid()
+        if self._executor is None or self._pid != pid:
+            with self._lock:
+                if self._executor is None or self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="upload-job")
+                    self._pid = pid
+        return self._executor
+
+    def wants_async(self):
+        # ?async=1 (or an "async" form field) per request, ASYNC_UPLOADS as the default
+        value = request.args.get("async", request.form.get("async"))
+        if value is None:
+            return bool(current_app.config.get("ASYNC_UPLOADS", self.default_async))
+        return value.lower() in ("1", "true", "yes")
+
+    def submit(self, db, validated_data, pictures, type_id):
+        """
+        Accept a validated submission. ``pictures`` maps content fields to uploaded files (``None`` entries are
+        skipped). Inserts the content without its pictures and returns the job document.
+        """
+        ensure_required_indexes(db, "upload_jobs")
+        job_id = ObjectId()
+        spooled = self.spool(job_id, pictures)
+
+        validated_data.update({field: None for field in pictures})
+        validated_data["type_id"] = type_id
+        validated_data["status"] = "uploading"
+        validated_data["upload_job_id"] = str(job_id)
+        db["content"].insert_one(validated_data)
+
+        job = {
+            "_id": job_id,
+            "content_id": str(validated_data["_id"]),
+            "type_id": type_id,
+            "status": "queued",
+            "files": {field: {"filename": spool["filename"], "progress": 0.0} for field, spool in spooled.items()},
+            "error": None,
+            "created_at": now(),
+            "updated_at": None,
+            "expired_at": dt.datetime.now(pytz.utc) + dt.timedelta(seconds=self.job_ttl),
+        }
+        try:
+            db["upload_jobs"].insert_one(job)
+            self.executor().submit(self.run, job_id, validated_data["_id"], type_id, spooled)
+        except Exception:
+            db["content"].delete_one({"_id": validated_data["_id"], "status": "uploading"})
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            raise
+        return job
+
+    def job_dir(self, job_id):
+        return os.path.join(self.spool_dir, str(job_id))
+
+    def spool(self, job_id, pictures):
+        directory = self.job_dir(job_id)
+        os.makedirs(directory, exist_ok=True)
+        spooled = {}
+        for field, file in pictures.items():
+            if file is None:
+                continue
+            path = os.path.join(directory, field)
+            file.save(path)
+            spooled[field] = {"path": path, "filename": file.filename, "content_type": file.content_type}
+        return spooled
+
+    def run(self, job_id, content_id, type_id, spooled):
+        db = database_connect_mongo()
+        jobs = db["upload_jobs"]
+        fields = list(spooled)
+        files = []
+        try:
+            jobs.update_one({"_id": job_id}, {"$set": {"status": "running", "updated_at": now()}})
+            uploader = S3Uploader(S3Config())
+            for field in fields:
+                spool = spooled[field]
+                files.append(FileStorage(stream=open(spool["path"], "rb"), filename=spool["filename"],
+                                         content_type=spool["content_type"]))
+            uploaded = uploader.upload_files(files, on_progress=self.progress_writer(jobs, job_id, fields),
+                                             type_id=type_id, status="pending")
+
+            with uploader.release_on_error(dict(zip(fields, uploaded))):
+                result = db["content"].update_one(
+                    {"_id": content_id, "status": "uploading"},
+                    {"$set": {**dict(zip(fields, uploaded)), "status": "pending", "updated_at": now()}})
+            if not result.matched_count:
+                # The content was removed while uploading; give the references back
+                for item in uploaded:
+                    uploader.release_file(item)
+            jobs.update_one({"_id": job_id}, {"$set": {"status": "done", "updated_at": now(),
+                                                       **{f"files.{field}.progress": 100.0 for field in fields}}})
+        except Exception as e:
+            print(f"Upload job {job_id} failed: {e}")
+            db["content"].update_one({"_id": content_id, "status": "uploading"},
+                                     {"$set": {"status": "delete", "remarks": f"Upload failed: {e}",
+                                               "updated_at": now()}})
+            jobs.update_one({"_id": job_id}, {"$set": {"status": "failed", "error": str(e), "updated_at": now()}})
+        finally:
+            for file in files:
+                file.close()
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def progress_writer(self, jobs, job_id, fields):
+        # ProgressPercentage fires per chunk; only write when a file moved by progress_step percent
+        written = {}
+
+        def on_progress(index, percent):
+            field = fields[index]
+            if percent < 100 and percent - written.get(field, 0.0) < self.progress_step:
+                return
+            written[field] = percent
+            jobs.update_one({"_id": job_id}, {"$set": {f"files.{field}.progress": round(percent, 1),
+                                                       "updated_at": now()}})
+
+        return on_progress
+
+    def status(self, db, job_id):
+        try:
+            job = db["upload_jobs"].find_one({"_id": ObjectId(job_id)}, {"expired_at": 0})
+        except (InvalidId, TypeError):
+            return None
+        if job is None:
+            return None
+        job["_id"] = str(job["_id"])
+        progress = [file["progress"] for file in job["files"].values()]
+        job["progress"] = round(sum(progress) / len(progress), 1) if progress else 100.0
+        return job
+
+
+upload_queue = UploadQueue()
@@ -2,43 +2,75 @@ from flask import make_response, jsonify, Blueprint, request
 from flask.views import MethodView
 from flask_cors import cross_origin
 
+from app.cache import catalog_cache
+from app.etag import result_etag, not_modified, with_etag, cache_control
+from app.queries import PageError, parse_page, find_page, distinct_page
+from app.search import variant_search, content_search
 from db_connection import start_and_check_mongo, database_connect_mongo, stop_and_check_mongo_status, conn
 
 user = Blueprint('user', __name__)
+# Clients may keep responses but must revalidate; unchanged data comes back as a bodyless 304
+cache_control(user, "public, no-cache")
+
+# Matches returned for a search when the client does not send a limit
+SEARCH_LIMIT = 50
+CONTENT_SEARCH_LIMIT = 20
+CONTENT_SEARCH_MAX_LENGTH = 200
 
 
 class FetchGrain(MethodView):
     @cross_origin(supports_credentials=True)
+    @catalog_cache.cached
     def post(self):
         try:
             start_and_check_mongo()
             db = database_connect_mongo()
             if db is not None:
                 db1 = db["grain_assign"]
-                find_grain = db1.find(
-                    {"status": "active", "type_id": "grain_variant_assign", "approve_status": {"$nin": ["pending"]}},
-                    {"grain": 1, "status": 1, "grain_pic": 1})
-                find_grain_list = list(find_grain)
+                query = {"status": "active", "type_id": "grain_variant_assign", "approve_status": {"$nin": ["pending"]}}
+                projection = {"grain": 1, "status": 1, "grain_pic": 1}
+                page = parse_page(request.get_json(silent=True))
+
+                etag = result_etag(db, "catalog", request.get_json(silent=True))
+                unchanged = not_modified(etag)
+                if unchanged is not None:
+                    stop_and_check_mongo_status(conn)
+                    return unchanged
+
+                if page is None:
+                    find_grain_list, page_info = list(db1.find(query, projection)), None
+                else:
+                    # Paged by grain name; the database keeps one variant per grain, like the unpaged loop below
+                    find_grain_list, total_grain, page_info = distinct_page(db1, query, "grain", projection, page)
 
                 if find_grain_list:
 
                     unique_grains = {}
 
                     for item in find_grain_list:
+                        item["_id"] = str(item["_id"])
                         unique_grains[item["grain"]] = item
-                        unique_grains[item["grain"]]["grain_pic"] = db1.find_one(
-                            {"grain": unique_grains[item["grain"]]["grain"], "status": "active",
-                             "type_id": "grain_assign"}).get("grain_pic", "No picture added")
-                        unique_grains[item["grain"]]["_id"] = str(item["_id"])
+
+                    # Prefetch every grain's picture in one query instead of one find_one per variant
+                    grain_pics = {}
+                    for grain in db1.find({"grain": {"$in": list(unique_grains)}, "status": "active",
+                                           "type_id": "grain_assign"}, {"_id": 0, "grain": 1, "grain_pic": 1}):
+                        grain_pics.setdefault(grain["grain"], grain.get("grain_pic", "No picture added"))
+
+                    for grain, item in unique_grains.items():
+                        item["grain_pic"] = grain_pics.get(grain, "No picture added")
 
                     unique_grain_list = list(unique_grains.values())
 
-                    total_grain = len(unique_grain_list)
+                    if page is None:
+                        total_grain = len(unique_grain_list)
 
                     response = {"status": 'success', "data": unique_grain_list, "total_grain": total_grain,
                                 "message": "All grain fetched successfully"}
+                    if page_info:
+                        response["page"] = page_info
                     stop_and_check_mongo_status(conn)
-                    return make_response(jsonify(response)), 200
+                    return with_etag(make_response(jsonify(response)), etag), 200
 
                 else:
                     response = {"status": 'val_error', "message": {"country": ["Please assign a grain variant first"]}}
@@ -50,6 +82,11 @@ class FetchGrain(MethodView):
                 stop_and_check_mongo_status(conn)
                 return make_response(jsonify(response)), 400
 
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
         except Exception as e:
             import traceback
             traceback.print_exc()
@@ -60,6 +97,7 @@ class FetchGrain(MethodView):
 
 class FetchCountryBasedOnGrain(MethodView):
     @cross_origin(supports_credentials=True)
+    @catalog_cache.cached
     def post(self):
         try:
             start_and_check_mongo()
@@ -95,15 +133,16 @@ class FetchCountryBasedOnGrain(MethodView):
 
                 query = {"status": "active", "type_id": "grain_assign", "grain": grain}
 
-                find_country = db1.find(query, {"country": 1, "loc_id": 1})
+                etag = result_etag(db, "catalog", data)
+                unchanged = not_modified(etag)
+                if unchanged is not None:
+                    return unchanged
 
-                if not find_country:
-                    response = {"status": 'val_error', "message": {"country": ["Please assign a grain first"]}}
-                    stop_and_check_mongo_status(conn)
-                    return make_response(jsonify(response)), 400
+                find_country_list, total_country, page_info = find_page(db1, query, {"country": 1, "loc_id": 1}, None,
+                                                                        parse_page(data), count=False)
 
-                find_country_list = list(find_country)
-                total_country = len(find_country_list)
+                if page_info is None:
+                    total_country = len(find_country_list)
 
                 # Convert ObjectId to string
                 for item in find_country_list:
@@ -111,8 +150,15 @@ class FetchCountryBasedOnGrain(MethodView):
 
                 response = {"status": 'success', "data": find_country_list, "total_country": total_country,
                             "message": "All country fetched successfully"}
+                if page_info:
+                    response["page"] = page_info
 
-                return make_response(jsonify(response)), 200
+                return with_etag(make_response(jsonify(response)), etag), 200
+
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
 
         except Exception as e:
             import traceback
@@ -127,6 +173,7 @@ class FetchCountryBasedOnGrain(MethodView):
 
 class FetchGrainVariant(MethodView):
     @cross_origin(supports_credentials=True)
+    @catalog_cache.cached
     def post(self):
         try:
             start_and_check_mongo()
@@ -151,6 +198,7 @@ class FetchGrainVariant(MethodView):
                 return make_response(jsonify(response)), 400
 
             grain, c_id, r_id, search = data["grain"], data["c_id"], data["r_id"], data["search"]
+            page = parse_page(data)
 
             if not grain or not c_id or not r_id:
                 response = {"status": 'val_error', "message": {"Details": ["Please enter all details"]}}
@@ -159,13 +207,19 @@ class FetchGrainVariant(MethodView):
 
             elif search:
                 query = {"status": "active", "type_id": "grain_variant_assign", "grain": grain, "c_id": c_id,
-                         "r_id": r_id, "approve_status": {"$nin": ["pending"]},
-                         "grain_variant": {"$exists": True, "$regex": search, "$options": "i"}}
-                find_grain_variant = db1.find(query,
-                                              {"grain_variant": 1, "status": 1, "approve_status": 1, "gv_pic": 1}).sort(
-                    "grain_variant", 1)
-
-                find_grain_variant_list = list(find_grain_variant)
+                         "r_id": r_id, "approve_status": {"$nin": ["pending"]}}
+                etag = result_etag(db, "catalog", data)
+                unchanged = not_modified(etag)
+                if unchanged is not None:
+                    return unchanged
+
+                # Ranked by relevance rather than name, so a page is the top `limit` matches (no cursor)
+                if page is not None and page["after"]:
+                    raise PageError("after", "Search results are ranked and cannot be continued with a cursor")
+                limit = page["limit"] if page is not None else SEARCH_LIMIT
+                find_grain_variant_list, has_more = variant_search.search(
+                    db, search, query, {"grain_variant": 1, "status": 1, "approve_status": 1, "gv_pic": 1}, limit)
+                page_info = {"limit": limit, "next_cursor": None, "has_more": has_more} if page is not None else None
 
                 if not find_grain_variant_list:
                     response = {"status": 'val_error', "message": {"Details": ["Grain variant not found"]}}
@@ -183,25 +237,31 @@ class FetchGrainVariant(MethodView):
                     "total_grain_variant": total_grain_variant,
                     "message": "Grain variant fetched successfully"
                 }
+                if page_info:
+                    response["page"] = page_info
 
-                return make_response(jsonify(response)), 200
+                return with_etag(make_response(jsonify(response)), etag), 200
 
             else:
                 query = {"status": "active", "type_id": "grain_variant_assign", "grain": grain, "c_id": c_id,
                          "r_id": r_id, "approve_status": {"$nin": ["pending"]}}
 
-                find_grain_variant = db1.find(query,
-                                              {"grain_variant": 1, "status": 1, "approve_status": 1, "gv_pic": 1}).sort(
-                    "grain_variant", 1)
+                etag = result_etag(db, "catalog", data)
+                unchanged = not_modified(etag)
+                if unchanged is not None:
+                    return unchanged
 
-                find_grain_variant_list = list(find_grain_variant)
+                find_grain_variant_list, total_grain_variant, page_info = find_page(
+                    db1, query, {"grain_variant": 1, "status": 1, "approve_status": 1, "gv_pic": 1}, "grain_variant",
+                    page, count=False)
 
                 if not find_grain_variant_list:
                     response = {"status": 'val_error', "message": {"Details": ["Please assign a grain variant"]}}
                     stop_and_check_mongo_status(conn)
                     return make_response(jsonify(response)), 400
 
-                total_grain_variant = len(find_grain_variant_list)
+                if page_info is None:
+                    total_grain_variant = len(find_grain_variant_list)
 
                 for item in find_grain_variant_list:
                     item["_id"] = str(item["_id"])
@@ -212,8 +272,71 @@ class FetchGrainVariant(MethodView):
                     "total_grain_variant": total_grain_variant,
                     "message": "Grain variant fetched successfully"
                 }
+                if page_info:
+                    response["page"] = page_info
+
+                return with_etag(make_response(jsonify(response)), etag), 200
+
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            stop_and_check_mongo_status(conn)
+            return make_response(jsonify(response)), 400
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return make_response(jsonify({
+                "status": 'val_error',
+                "message": str(e)
+            })), 500
+
+        finally:
+            stop_and_check_mongo_status(conn)
+
+
+class SearchContent(MethodView):
+    @cross_origin(supports_credentials=True)
+    @catalog_cache.cached
+    def post(self):
+        try:
+            start_and_check_mongo()
+            db = database_connect_mongo()
+
+            if db is None:
+                return make_response(jsonify({
+                    "status": 'val_error',
+                    "message": {"Details": ["Database connection failed"]}
+                })), 400
+
+            data = request.get_json()
+            search = str(data.get("search") or "").strip()
+
+            if not search:
+                response = {"status": 'val_error', "message": {"Details": ["search is required"]}}
+                return make_response(jsonify(response)), 400
+
+            if len(search) > CONTENT_SEARCH_MAX_LENGTH:
+                response = {"status": 'val_error',
+                            "message": {"Details": [f"search must be at most {CONTENT_SEARCH_MAX_LENGTH} characters"]}}
+                return make_response(jsonify(response)), 400
+
+            page = parse_page(data) or {"limit": CONTENT_SEARCH_LIMIT, "after": None, "total": False}
+            results, total, page_info = content_search.search(db, search, page)
+
+            response = {
+                "status": "success",
+                "data": results,
+                "page": page_info,
+                "message": "Content searched successfully"
+            }
+            if total is not None:
+                response["total_content"] = total
+
+            return make_response(jsonify(response)), 200
 
-                return make_response(jsonify(response)), 200
+        except PageError as err:
+            response = {"status": 'val_error', "message": err.messages}
+            return make_response(jsonify(response)), 400
 
         except Exception as e:
             import traceback
@@ -230,7 +353,9 @@ class FetchGrainVariant(MethodView):
 fetch_grain = FetchGrain.as_view('fetch_grain_view')
 fetch_country = FetchCountryBasedOnGrain.as_view('fetch_country_view')
 fetch_grain_variant = FetchGrainVariant.as_view('fetch_grain_variant_view')
+search_content = SearchContent.as_view('search_content_view')
 
 user.add_url_rule('/user/fetch_grain', view_func=fetch_grain, methods=['POST'])
 user.add_url_rule('/user/fetch_country', view_func=fetch_country, methods=['POST'])
 user.add_url_rule('/user/fetch_grain_variant', view_func=fetch_grain_variant, methods=['POST'])
+user.add_url_rule('/user/search_content', view_func=search_content, methods=['POST'])
@@ -0,0 +1,41 @@
+import statistics
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "requests": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def time_requests(client, path, payload, requests, warmup=5, before_request=None):
+    for _ in range(warmup):
+        client.post(path, json=payload)
+
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        if before_request:
+            before_request()
+        response = client.post(path, json=payload)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def print_summary(label, samples):
+    summary = summarize(samples)
+    print(f"{label:<24} n={summary['requests']:<6} mean={summary['mean_ms']:>9}ms "
+          f"p50={summary['p50_ms']:>9}ms p99={summary['p99_ms']:>9}ms")
+    return summary
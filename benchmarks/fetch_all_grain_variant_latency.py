@@ -0,0 +1,62 @@
+"""
+Measure POST /grain/fetch_all_grain_and_variant latency as the number of grain variants grows.
+
+    python -m benchmarks.fetch_all_grain_variant_latency --sizes 10 100 500 1000 --requests 100
+
+Synthetic variants (each with a few content documents) are seeded under a throwaway ``emp_assign`` and removed
+afterwards, even when a run fails. They are seeded as pending approval so the public catalog never lists them;
+point ``--config`` at a development database anyway.
+
+With the single ``$in`` content lookup the p50 should stay roughly flat across sizes instead of growing with one
+round trip per variant.
+"""
+import argparse
+import uuid
+
+from app import create_app
+from benchmarks.common import time_requests, print_summary
+from db_connection import database_connect_mongo
+
+CONTENT_TYPES = ["morphology", "agronomy", "pre_harvest", "post_harvest"]
+
+
+def seed(db, emp_assign, size):
+    variants = [{"status": "active", "c_id": "bench_c", "r_id": "bench_r", "type_id": "grain_variant_assign",
+                 "emp_assign": emp_assign, "approve_status": "pending", "grain": f"grain_{i % 20}",
+                 "grain_variant": f"variant_{i}"}
+                for i in range(size)]
+    inserted = db["grain_assign"].insert_many(variants).inserted_ids
+    contents = [{"g_v_id": str(g_v_id), "type_id": type_id, "status": "pending", "emp_assign": emp_assign}
+                for g_v_id in inserted for type_id in CONTENT_TYPES]
+    db["content"].insert_many(contents)
+
+
+def cleanup(db, emp_assign):
+    db["grain_assign"].delete_many({"emp_assign": emp_assign})
+    db["content"].delete_many({"emp_assign": emp_assign})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="development")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    app = create_app(config_name=args.config)
+    client = app.test_client()
+    db = database_connect_mongo()
+
+    for size in args.sizes:
+        emp_assign = f"bench_{uuid.uuid4().hex}"
+        try:
+            seed(db, emp_assign, size)
+            payload = {"c_id": "bench_c", "r_id": "bench_r", "emp_assign": emp_assign}
+            samples = time_requests(client, "/grain/fetch_all_grain_and_variant", payload, args.requests)
+            print_summary(f"{size} variants", samples)
+        finally:
+            cleanup(db, emp_assign)
+
+
+if __name__ == '__main__':
+    main()
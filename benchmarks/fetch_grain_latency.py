@@ -0,0 +1,47 @@
+"""
+Measure p50/p99 latency of POST /grain/fetch_grain against the configured MongoDB.
+
+    python -m benchmarks.fetch_grain_latency --requests 500
+
+``--legacy-connect`` replays the connection work every request used to do before the pooled client
+(two fresh MongoClients, a ping, dbstats and a second ping) so both numbers can be compared on the same box.
+"""
+import argparse
+
+import pymongo
+
+from app import create_app
+from benchmarks.common import time_requests, print_summary
+from db_connection import get_url, port_mongo, db_name_mongo
+
+
+def legacy_connect():
+    client = pymongo.MongoClient(get_url(), port_mongo, serverSelectionTimeoutMS=5000)
+    client.admin.command('ping')
+    client[db_name_mongo].command("dbstats")
+    client.close()
+    client = pymongo.MongoClient(get_url(), port_mongo)
+    client.admin.command('ping')
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="production")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--legacy-connect", action="store_true")
+    args = parser.parse_args()
+
+    app = create_app(config_name=args.config)
+    client = app.test_client()
+
+    pooled = time_requests(client, "/grain/fetch_grain", {}, args.requests)
+    print_summary("pooled client", pooled)
+
+    if args.legacy_connect:
+        legacy = time_requests(client, "/grain/fetch_grain", {}, args.requests, before_request=legacy_connect)
+        print_summary("legacy connect/ping", legacy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Requests-per-second of the production server as the number of gunicorn workers grows.
+
+    python -m benchmarks.load_test --workers 1 2 4 8 --duration 20 --clients 32
+
+For every worker count a gunicorn master is started with gunicorn.conf.py (GRAIN_WORKERS=<n>), warmed up, and then
+loaded by ``--clients`` keep-alive connections spread over several client processes for ``--duration`` seconds.
+One line per worker count is printed with the achieved RPS and p50/p99 latency. Run it on the target box with
+MongoDB reachable; on an otherwise idle machine RPS should grow roughly linearly up to the number of cores.
+
+Use ``--url`` to load an already running server instead (``--workers`` is then ignored).
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+from benchmarks.common import percentile
+
+
+def client_loop(url, path, payload, duration, connections, result_queue):
+    import threading
+
+    target = urlparse(url)
+    body = json.dumps(payload)
+    headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+    deadline = time.perf_counter() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def run():
+        conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+                local.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=run) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result_queue.put((latencies, errors[0]))
+
+
+def run_load(url, path, payload, duration, clients, processes):
+    queue = multiprocessing.Queue()
+    per_process = max(1, clients // processes)
+    workers = [multiprocessing.Process(target=client_loop, args=(url, path, payload, duration, per_process, queue))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    latencies, errors = [], 0
+    for _ in workers:
+        samples, failed = queue.get()
+        latencies.extend(samples)
+        errors += failed
+    for worker in workers:
+        worker.join()
+    return latencies, errors
+
+
+def wait_until_ready(url, path, timeout=60):
+    target = urlparse(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(target.hostname, target.port, timeout=5)
+            conn.request("POST", path, body="{}", headers={"Content-Type": "application/json"})
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def report(label, latencies, errors, duration):
+    rps = len(latencies) / duration
+    print(f"{label:<12} rps={rps:>9.1f} p50={percentile(latencies, 50) * 1000:>8.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:>8.2f}ms errors={errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, multiprocessing.cpu_count()])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--path", default="/grain/fetch_grain")
+    parser.add_argument("--payload", default="{}", help="JSON request body")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument("--client-processes", type=int, default=max(1, multiprocessing.cpu_count() // 2))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="load an already running server instead of starting gunicorn")
+    args = parser.parse_args()
+    payload = json.loads(args.payload)
+
+    if args.url:
+        latencies, errors = run_load(args.url, args.path, payload, args.duration, args.clients,
+                                     args.client_processes)
+        report("external", latencies, errors, args.duration)
+        return
+
+    url = f"http://127.0.0.1:{args.port}"
+    for count in args.workers:
+        env = dict(os.environ, GRAIN_WORKERS=str(count), GRAIN_THREADS=str(args.threads),
+                   GRAIN_BIND=f"127.0.0.1:{args.port}", GRAIN_ACCESS_LOG="/dev/null")
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:used_app"],
+                                  env=env)
+        try:
+            if not wait_until_ready(url, args.path):
+                print(f"{count} workers: server did not come up")
+                continue
+            run_load(url, args.path, payload, min(5.0, args.duration), args.clients, args.client_processes)
+            latencies, errors = run_load(url, args.path, payload, args.duration, args.clients,
+                                         args.client_processes)
+            report(f"{count} workers", latencies, errors, args.duration)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+
+if __name__ == '__main__':
+    main()
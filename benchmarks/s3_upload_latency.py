@@ -0,0 +1,82 @@
+"""
+Compare per-upload latency of the old S3 path (new client plus bucket stats before every upload) with the
+cached client, against an in-process moto S3 stand-in.
+
+    pip install "moto[s3]"
+    python -m benchmarks.s3_upload_latency --uploads 200 --size-kb 400
+
+Point ``--endpoint-url`` at a MinIO server instead to include real network round trips.
+"""
+import argparse
+import io
+import os
+import time
+
+import boto3
+
+from benchmarks.common import print_summary
+from settings.configuration import get_cached_s3_client, reset_s3_clients
+
+BUCKET = "grain-library-bench"
+REGION = "us-east-1"
+
+
+def legacy_upload(payload, key, endpoint_url):
+    s3 = boto3.client('s3', aws_access_key_id="bench", aws_secret_access_key="bench", region_name=REGION,
+                      endpoint_url=endpoint_url)
+    s3.head_bucket(Bucket=BUCKET)
+    s3.list_objects_v2(Bucket=BUCKET)
+    folders = s3.list_objects_v2(Bucket=BUCKET, Delimiter='/').get('CommonPrefixes', [])
+    for folder in folders:
+        s3.list_objects_v2(Bucket=BUCKET, Prefix=folder['Prefix'])
+    s3.upload_fileobj(io.BytesIO(payload), BUCKET, key)
+
+
+def cached_upload(payload, key, endpoint_url):
+    s3 = get_cached_s3_client("bench", "bench", REGION, endpoint_url=endpoint_url)
+    s3.upload_fileobj(io.BytesIO(payload), BUCKET, key)
+
+
+def run(label, upload, uploads, payload, endpoint_url):
+    samples = []
+    for i in range(uploads):
+        start = time.perf_counter()
+        upload(payload, f"grain/active/{label}_{i}.jpg", endpoint_url)
+        samples.append(time.perf_counter() - start)
+    return print_summary(label, samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=100)
+    parser.add_argument("--size-kb", type=int, default=400)
+    parser.add_argument("--prefixes", type=int, default=20, help="top-level folders seeded in the bucket")
+    parser.add_argument("--endpoint-url", default=None)
+    args = parser.parse_args()
+
+    payload = os.urandom(args.size_kb * 1024)
+
+    def bench():
+        s3 = boto3.client('s3', aws_access_key_id="bench", aws_secret_access_key="bench", region_name=REGION,
+                          endpoint_url=args.endpoint_url)
+        s3.create_bucket(Bucket=BUCKET)
+        for i in range(args.prefixes):
+            s3.put_object(Bucket=BUCKET, Key=f"prefix_{i}/seed.jpg", Body=b"seed")
+        reset_s3_clients()
+        run("legacy", legacy_upload, args.uploads, payload, args.endpoint_url)
+        run("cached", cached_upload, args.uploads, payload, args.endpoint_url)
+
+    if args.endpoint_url:
+        bench()
+        return
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        from moto import mock_s3 as mock_aws
+    with mock_aws():
+        bench()
+
+
+if __name__ == '__main__':
+    main()
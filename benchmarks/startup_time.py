@@ -0,0 +1,76 @@
+"""
+Measure how long a fresh interpreter takes to import the app package and to run create_app.
+
+    python -m benchmarks.startup_time --runs 20
+    python -m benchmarks.startup_time --importtime   # also list the slowest imports of one run
+
+Every run is a new process, so nothing is cached between samples. Importing and creating the app should not
+touch MongoDB or S3 any more; with the database unreachable the numbers should stay the same.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import print_summary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app(config_name=sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({"import": imported - start, "create_app": created - imported, "total": created - start}))
+"""
+
+
+def run_probe(config_name, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", PROBE, config_name]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_log, count):
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="production")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true", help="print the slowest imports of one extra run")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    samples = {"import": [], "create_app": [], "total": []}
+    for _ in range(args.runs):
+        timings, _ = run_probe(args.config)
+        for name, seconds in timings.items():
+            samples[name].append(seconds)
+
+    for name, values in samples.items():
+        print_summary(name, values)
+
+    if args.importtime:
+        _, log = run_probe(args.config, importtime=True)
+        print("\nslowest imports (cumulative):")
+        for cumulative, name in slowest_imports(log, args.top):
+            print(f"{cumulative / 1000:>10.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
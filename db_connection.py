@@ -1,3 +1,5 @@
+import os
+import threading
 import time
 
 import pymongo
@@ -5,36 +7,53 @@ import pymongo.errors
 
 from settings.configuration import ProductionConfig, DevelopmentConfig
 
-url_mongo_d = DevelopmentConfig.url_mongo
-url_mongo_p = ProductionConfig.url_mongo
-port_mongo = DevelopmentConfig.port_mongo
-db_name_mongo = DevelopmentConfig.db_name_mongo
-db_username = ProductionConfig.db_username
-db_password = ProductionConfig.db_password
-
 apps = ["development", "production"]
 used_app = apps[1]
 
+# Nothing here touches keys.json or the network at import; settings are read and the client is built on first use.
+# Kept for the views that still pass it to stop_and_check_mongo_status.
+conn = None
+
+_LAZY_SETTINGS = {
+    "url_mongo_d": (DevelopmentConfig, "url_mongo"),
+    "url_mongo_p": (ProductionConfig, "url_mongo"),
+    "port_mongo": (DevelopmentConfig, "port_mongo"),
+    "db_name_mongo": (DevelopmentConfig, "db_name_mongo"),
+    "db_username": (ProductionConfig, "db_username"),
+    "db_password": (ProductionConfig, "db_password"),
+}
+
+
+def __getattr__(name):
+    # Module-level settings (url_mongo_d, port_mongo, ...) and ``db`` are resolved when first accessed
+    if name in _LAZY_SETTINGS:
+        config, attribute = _LAZY_SETTINGS[name]
+        return getattr(config, attribute)
+    if name == "db":
+        return database_connect_mongo()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_url():
     if used_app == apps[0]:
-        return url_mongo_d
+        return DevelopmentConfig.url_mongo
     else:
-        return url_mongo_p
+        return ProductionConfig.url_mongo
 
 
-def connect_mongo_db(url, port, timeout_ms=5000):
+def connect_mongo_db(url, port, timeout_ms=5000, **pool_options):
     max_retries = 3
     retry_delay = 1  # second
 
     for attempt in range(max_retries):
         try:
-            if url == url_mongo_d and port == port_mongo:
-                return pymongo.MongoClient(url, port, serverSelectionTimeoutMS=timeout_ms)
+            if url == DevelopmentConfig.url_mongo and port == DevelopmentConfig.port_mongo:
+                return pymongo.MongoClient(url, port, serverSelectionTimeoutMS=timeout_ms, **pool_options)
 
-            elif url == url_mongo_p and port == port_mongo:
-                return pymongo.MongoClient(url, port, username=db_username, password=db_password,
-                                           serverSelectionTimeoutMS=timeout_ms)
+            elif url == ProductionConfig.url_mongo and port == ProductionConfig.port_mongo:
+                return pymongo.MongoClient(url, port, username=ProductionConfig.db_username,
+                                           password=ProductionConfig.db_password,
+                                           serverSelectionTimeoutMS=timeout_ms, **pool_options)
             else:
                 return None
 
@@ -62,54 +81,111 @@ def connect_database(db_name, db_connect):
         return None
 
 
+class MongoPool:
+    """
+    Process-wide MongoClient with a configurable connection pool.
+
+    The client is created lazily and re-created after a fork, so every worker process owns its own pool.
+    """
+
+    def __init__(self):
+        # Settings come from the app config in init_app, or from the default config on first use outside an app
+        self.pool_options = None
+        self.timeout_ms = None
+        self.health_check_interval = None
+        self.event_listeners = []
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = 0.0
+
+    def configure(self, config):
+        self.pool_options = {
+            "maxPoolSize": config.get("MONGO_MAX_POOL_SIZE", 50),
+            "minPoolSize": config.get("MONGO_MIN_POOL_SIZE", 0),
+            "maxIdleTimeMS": config.get("MONGO_MAX_IDLE_TIME_MS", 60000),
+            "waitQueueTimeoutMS": config.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000),
+        }
+        self.timeout_ms = config.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+        self.health_check_interval = config.get("MONGO_HEALTH_CHECK_INTERVAL", 30)
+
+    def init_app(self, app):
+        self.configure(app.config)
+        self.reset()
+        app.extensions["mongo_pool"] = self
+
+    def add_event_listener(self, listener):
+        # pymongo command/pool listeners; they apply to clients created after this call
+        if listener not in self.event_listeners:
+            self.event_listeners.append(listener)
+
+    def client(self):
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            with self._lock:
+                if self._client is None or self._pid != pid:
+                    if self.pool_options is None:
+                        self.configure({name: getattr(DevelopmentConfig, name) for name in dir(DevelopmentConfig)
+                                        if name.startswith("MONGO_")})
+                    self._client = connect_mongo_db(get_url(), DevelopmentConfig.port_mongo, timeout_ms=self.timeout_ms,
+                                                    event_listeners=list(self.event_listeners), **self.pool_options)
+                    self._pid = pid
+                    self._checked_at = 0.0
+        return self._client
+
+    def database(self):
+        return connect_database(DevelopmentConfig.db_name_mongo, self.client())
+
+    def health_check(self, force=False):
+        # Ping at most once per interval; in between, the last known state is returned
+        now = time.monotonic()
+        if not force and self._checked_at and now - self._checked_at < self.health_check_interval:
+            return self._healthy
+        client = self.client()
+        try:
+            client.admin.command('ping')
+            self._healthy = True
+        except (pymongo.errors.PyMongoError, AttributeError) as e:
+            print(f"MongoDB health check failed: {e}")
+            self._healthy = False
+        self._checked_at = now
+        return self._healthy
+
+    def reset(self):
+        # Called in a forked child: drop the parent's client without closing its sockets
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._healthy = False
+        self._checked_at = 0.0
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._pid = None
+
+
+mongo_pool = MongoPool()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=mongo_pool.reset)
+
+
 def database_connect_mongo(timeout_ms=5000):
-    url = get_url()
-    port = port_mongo
-    conn = connect_mongo_db(url, port, timeout_ms=timeout_ms)
-    if conn:
-        db_con = connect_database(db_name_mongo, conn)
-        if db_con is not None:
-            try:
-                status = db_con.command("dbstats")
-                print("Database stats:", status)
-            except Exception as e:
-                print(f"Error getting database stats: {e}")
-        return db_con
-    return None
+    return mongo_pool.database()
 
 
 def start_and_check_mongo(timeout_ms=5000):
-    url = get_url()
-    port = port_mongo
-    try:
-        conn = pymongo.MongoClient(url, port, serverSelectionTimeoutMS=timeout_ms, socketTimeoutMS=5000)
-        conn.admin.command('ping')
-        print("MongoDB connection established and server is running")
-        return conn
-    except pymongo.errors.ConnectionFailure as e:
-        print("Failed to establish MongoDB connection or server is not running")
-        return None
+    if mongo_pool.health_check():
+        return mongo_pool.client()
+    print("Failed to establish MongoDB connection or server is not running")
+    return None
 
 
 def stop_and_check_mongo_status(conn):
-    if conn:
-        try:
-            conn.close()
-            print("MongoDB connection closed")
-        except Exception as e:
-            print(f"Error closing MongoDB connection: {e}")
-    url = get_url()
-    try:
-        client = pymongo.MongoClient(url, port_mongo)
-        client.admin.command('ping')
-        print("MongoDB server is running")
-    except pymongo.errors.ConnectionFailure as e:
-        print("MongoDB server is not running")
-    finally:
-        client.close()
-
-
-conn = start_and_check_mongo(timeout_ms=5000)
-db = database_connect_mongo(timeout_ms=5000)
-# Perform operations on the database
-stop_and_check_mongo_status(conn)
+    # The pooled client lives for the whole process; connections are returned to the pool automatically
+    return None
+
@@ -0,0 +1,205 @@
+"""
+Declared MongoDB indexes for every collection the API queries.
+
+Indexes are built idempotently from the CLI, once per deploy:
+
+    flask --app main db-indexes ensure
+    flask --app main db-indexes explain
+
+``ENSURE_INDEXES_ON_STARTUP`` (off by default) builds them in a background thread whenever an app is created
+instead, i.e. in every gunicorn worker and CLI command; only use it for local development.
+
+The collections in ``REQUIRED`` do not work correctly without their indexes (TTL expiry, unique keys, the content
+text index), so those are also built on first use in each process by ``ensure_required_indexes``. The login_token
+owner indexes became unique: on an existing database drop ``e_id_1``/``s_id_1`` before running ``ensure``.
+
+``explain`` runs the representative view queries below through ``explain()`` and lists the ones MongoDB still
+answers with a COLLSCAN.
+"""
+import threading
+
+import click
+import pymongo.errors
+from flask.cli import AppGroup
+from pymongo import ASCENDING, TEXT, IndexModel
+
+# Same collation the validators and login lookups use; a query only uses these indexes when it passes it too
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+INDEXES = {
+    "grain": [
+        IndexModel([("type_id", ASCENDING), ("grain", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("grain", ASCENDING), ("grain_variant", ASCENDING)], collation=CASE_INSENSITIVE),
+    ],
+    "grain_assign": [
+        IndexModel([("type_id", ASCENDING), ("status", ASCENDING), ("c_id", ASCENDING), ("r_id", ASCENDING),
+                    ("emp_assign", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("type_id", ASCENDING), ("grain", ASCENDING)]),
+        # Name search (app/search.py); search_keys is the only array field, so the index can be multikey
+        IndexModel([("type_id", ASCENDING), ("grain", ASCENDING), ("c_id", ASCENDING), ("r_id", ASCENDING),
+                    ("search_keys", ASCENDING)]),
+    ],
+    "content": [
+        IndexModel([("g_v_id", ASCENDING), ("type_id", ASCENDING), ("status", ASCENDING)]),
+        # Content search (app/search.py): only approved content carries the search fields
+        IndexModel([("search_title", TEXT), ("search_text", TEXT)], name="content_text",
+                   weights={"search_title": 5, "search_text": 1}, default_language="english",
+                   language_override="search_language", partialFilterExpression={"status": "approve"}),
+    ],
+    "location": [
+        IndexModel([("email_id", ASCENDING)], collation=CASE_INSENSITIVE),
+        IndexModel([("location", ASCENDING)], collation=CASE_INSENSITIVE),
+        IndexModel([("type_id", ASCENDING), ("status", ASCENDING), ("country", ASCENDING),
+                    ("emp_assign", ASCENDING)]),
+    ],
+    "employee_registration": [
+        IndexModel([("email_id", ASCENDING)], collation=CASE_INSENSITIVE),
+        IndexModel([("phone_number", ASCENDING)], collation=CASE_INSENSITIVE),
+        IndexModel([("id_no", ASCENDING)], collation=CASE_INSENSITIVE),
+        IndexModel([("type_id", ASCENDING), ("status", ASCENDING), ("loc_id", ASCENDING)]),
+    ],
+    "super_location": [
+        IndexModel([("email_id", ASCENDING)], collation=CASE_INSENSITIVE),
+    ],
+    "super_employee": [
+        IndexModel([("email_id", ASCENDING)], collation=CASE_INSENSITIVE),
+    ],
+    "jwt": [
+        IndexModel([("token", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "login_token": [
+        IndexModel([("expired_at", ASCENDING)], expireAfterSeconds=0),
+        # One token per account; each document carries only one of the two owner fields
+        IndexModel([("e_id", ASCENDING)], unique=True, partialFilterExpression={"e_id": {"$exists": True}}),
+        IndexModel([("s_id", ASCENDING)], unique=True, partialFilterExpression={"s_id": {"$exists": True}}),
+    ],
+    "file_blobs": [
+        IndexModel([("sha256", ASCENDING)], unique=True),
+    ],
+    "upload_jobs": [
+        IndexModel([("expired_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# Built on first use even when nobody ran "db-indexes ensure"
+REQUIRED = ("login_token", "upload_jobs", "content", "file_blobs")
+_required_ready = set()
+_required_lock = threading.Lock()
+
+# (collection, label, filter, collation, sort) for the hottest view queries
+REPRESENTATIVE_QUERIES = [
+    ("grain_assign", "grain/fetch_all_grain_and_variant",
+     {"status": "active", "c_id": "x", "r_id": "x", "type_id": "grain_variant_assign", "emp_assign": "x"},
+     None, [("grain", ASCENDING)]),
+    ("grain_assign", "user/fetch_grain",
+     {"status": "active", "type_id": "grain_variant_assign", "approve_status": {"$nin": ["pending"]}}, None, None),
+    ("grain_assign", "user/fetch_grain (pictures)",
+     {"grain": {"$in": ["x"]}, "status": "active", "type_id": "grain_assign"}, None, None),
+    ("grain_assign", "user/fetch_grain_variant",
+     {"status": "active", "type_id": "grain_variant_assign", "grain": "x", "c_id": "x", "r_id": "x",
+      "approve_status": {"$nin": ["pending"]}}, None, [("grain_variant", ASCENDING)]),
+    ("grain_assign", "user/fetch_grain_variant (search)",
+     {"status": "active", "type_id": "grain_variant_assign", "grain": "x", "c_id": "x", "r_id": "x",
+      "approve_status": {"$nin": ["pending"]}, "search_keys": {"$all": ["p:x"]}}, None, None),
+    ("grain", "grain/fetch_grain", {"status": {"$ne": "delete"}, "type_id": "grain"}, None, [("grain", ASCENDING)]),
+    ("content", "content by variant", {"g_v_id": "x", "type_id": "story", "status": "approve"}, None, None),
+    ("location", "location/login", {"email_id": "x", "status": "active"}, CASE_INSENSITIVE, None),
+    ("location", "location/fetch_region", {"status": "active", "type_id": "region", "country": "x"}, None, None),
+    ("employee_registration", "employee list", {"status": {"$ne": "delete"}, "type_id": "admin"}, None,
+     [("status", ASCENDING)]),
+    ("employee_registration", "employee email check", {"email_id": "x"}, CASE_INSENSITIVE, None),
+    ("super_location", "super_employee/login", {"email_id": "x", "status": "active"}, CASE_INSENSITIVE, None),
+    ("jwt", "Admin_Access", {"token": "x", "status": "active"}, None, None),
+    ("login_token", "login token by employee", {"e_id": "x"}, None, None),
+]
+
+
+def ensure_collection_indexes(db, name):
+    # create_indexes is a no-op for indexes that already exist with the same key and options
+    return db[name].create_indexes(INDEXES[name])
+
+
+def ensure_required_indexes(db, name):
+    # Once per process: connection errors propagate and are retried on the next call, conflicts are reported
+    if name in _required_ready:
+        return
+    with _required_lock:
+        if name not in _required_ready:
+            try:
+                ensure_collection_indexes(db, name)
+            except pymongo.errors.OperationFailure as e:
+                print(f"Could not build indexes on {name}: {e}")
+            _required_ready.add(name)
+
+
+def ensure_indexes(db):
+    """Build every declared index; returns ``{collection: [index names]}`` and reports conflicts instead of raising."""
+    created = {}
+    for name in INDEXES:
+        try:
+            created[name] = ensure_collection_indexes(db, name)
+        except pymongo.errors.OperationFailure as e:
+            print(f"Could not build indexes on {name}: {e}")
+    return created
+
+
+def _plan_stages(plan):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for key in ("inputStage", "queryPlan", "thenStage", "elseStage"):
+            if key in plan:
+                yield from _plan_stages(plan[key])
+        for child in plan.get("inputStages", []):
+            yield from _plan_stages(child)
+
+
+def collscan_report(db):
+    """Explain each representative query and return ``(collection, label, stages)`` for those that COLLSCAN."""
+    report = []
+    for collection, label, query, collation, sort in REPRESENTATIVE_QUERIES:
+        cursor = db[collection].find(query, collation=collation)
+        if sort:
+            cursor = cursor.sort(sort)
+        stages = list(_plan_stages(cursor.explain().get("queryPlanner", {}).get("winningPlan", {})))
+        if "COLLSCAN" in stages:
+            report.append((collection, label, stages))
+    return report
+
+
+index_cli = AppGroup("db-indexes", help="Build and check the declared MongoDB indexes.")
+
+
+@index_cli.command("ensure")
+def ensure_command():
+    from db_connection import database_connect_mongo
+
+    for name, indexes in ensure_indexes(database_connect_mongo()).items():
+        click.echo(f"{name}: {', '.join(indexes)}")
+
+
+@index_cli.command("explain")
+def explain_command():
+    from db_connection import database_connect_mongo
+
+    report = collscan_report(database_connect_mongo())
+    if not report:
+        click.echo("No representative query does a COLLSCAN")
+    for collection, label, stages in report:
+        click.echo(f"COLLSCAN {collection:<24} {label:<40} {' > '.join(stages)}")
+
+
+def init_app(app):
+    app.cli.add_command(index_cli)
+    if app.config.get("ENSURE_INDEXES_ON_STARTUP"):
+        # create_indexes is a no-op for existing indexes, but it still needs the server: keep it off the boot path
+        threading.Thread(target=_ensure_indexes_in_background, name="ensure-indexes", daemon=True).start()
+
+
+def _ensure_indexes_in_background():
+    from db_connection import database_connect_mongo
+
+    try:
+        ensure_indexes(database_connect_mongo())
+    except pymongo.errors.PyMongoError as e:
+        print(f"Index build at startup failed: {e}")
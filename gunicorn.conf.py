@@ -0,0 +1,54 @@
+"""
+Production server settings.
+
+    gunicorn -c gunicorn.conf.py main:used_app
+
+Every setting can be overridden from the environment (GRAIN_WORKERS, GRAIN_THREADS, ...). Send SIGHUP to the
+master process for a graceful reload: new workers are started with the current code and old ones finish their
+in-flight requests before exiting.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GRAIN_BIND", "127.0.0.1:8000")
+
+# Processes scale with cores; threads per worker cover the time each request spends waiting on MongoDB and S3
+workers = int(os.environ.get("GRAIN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GRAIN_THREADS", 4))
+worker_class = "gthread"
+
+# Keep-alive behind a reverse proxy / load balancer; should be lower than the proxy's upstream idle timeout
+keepalive = int(os.environ.get("GRAIN_KEEPALIVE", 5))
+backlog = int(os.environ.get("GRAIN_BACKLOG", 2048))
+
+# Uploads stream large files to S3, so a request may legitimately take a while
+timeout = int(os.environ.get("GRAIN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GRAIN_GRACEFUL_TIMEOUT", 30))
+
+# Recycle workers periodically; the jitter keeps them from all restarting at once
+max_requests = int(os.environ.get("GRAIN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("GRAIN_MAX_REQUESTS_JITTER", 200))
+
+# Loading the app in the master makes worker boots cheaper, but then SIGHUP cannot pick up new code
+preload_app = os.environ.get("GRAIN_PRELOAD", "false").lower() == "true"
+
+accesslog = os.environ.get("GRAIN_ACCESS_LOG", "-")
+errorlog = os.environ.get("GRAIN_ERROR_LOG", "-")
+loglevel = os.environ.get("GRAIN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    # MongoClient and boto3 clients must not be shared across a fork: give each worker its own pools
+    from db_connection import mongo_pool
+    from settings.configuration import reset_s3_clients
+
+    mongo_pool.reset()
+    reset_s3_clients()
+    server.log.info("Worker %s: connection pools reset", worker.pid)
+
+
+def post_worker_init(worker):
+    # Optional warm-up (WARM_UP_ON_START): connect before the worker accepts its first request
+    from app import warm_up
+
+    warm_up(worker.wsgi)
@@ -2,11 +2,8 @@ from app import create_app
 
 used_app = create_app(config_name='production')
 
+# Development server only (single process). In production run the app under gunicorn:
+#     gunicorn -c gunicorn.conf.py main:used_app
+# Worker/thread counts, keep-alive and timeouts are set in gunicorn.conf.py (or via GRAIN_* env variables).
 if __name__ == '__main__':
     used_app.run(host="127.0.0.1", port=8000)
-
-# if __name__ == '__main__':
-#     waitress.serve(app, host="127.0.0.1", port=8000)
-
-# if __name__ == '__main__':
-#     used_app.run(host="grain.learn-up.org", port=8000)
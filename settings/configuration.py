@@ -1,31 +1,175 @@
 import json
+import os
+import threading
+import time
 
-import boto3
-import botocore
+# keys.json is read on first use, not at import. GRAIN_KEYS_FILE overrides the location; the relative Windows
+# path is kept as the last fallback for existing deployments.
+KEYS_FILE_CANDIDATES = (os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keys.json'), 'settings\\keys.json')
+_REQUIRED = object()
+_config_keys = None
+_config_keys_lock = threading.Lock()
 
-with open('settings\\keys.json', 'r') as file:
-    config_keys = json.load(file)
+
+def keys_file_path():
+    path = os.environ.get('GRAIN_KEYS_FILE')
+    if path:
+        return path
+    for candidate in KEYS_FILE_CANDIDATES:
+        if os.path.exists(candidate):
+            return candidate
+    return KEYS_FILE_CANDIDATES[0]
+
+
+def load_config_keys():
+    global _config_keys
+    if _config_keys is None:
+        with _config_keys_lock:
+            if _config_keys is None:
+                with open(keys_file_path(), 'r') as file:
+                    _config_keys = json.load(file)
+    return _config_keys
+
+
+class config_key:
+    """Class attribute resolved from keys.json when it is first read (e.g. by ``app.config.from_object``)."""
+
+    def __init__(self, name, default=_REQUIRED):
+        self.name = name
+        self.default = default
+
+    def __get__(self, instance, owner):
+        keys = load_config_keys()
+        if self.default is _REQUIRED:
+            return keys[self.name]
+        return keys.get(self.name, self.default)
 
 
 class Config:
-    USER_SECRET_KEY = config_keys['USER_SECRET_KEY']
-    ADMIN_SECRET_KEY = config_keys['ADMIN_SECRET_KEY']
+    USER_SECRET_KEY = config_key('USER_SECRET_KEY')
+    ADMIN_SECRET_KEY = config_key('ADMIN_SECRET_KEY')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_DATABASE_URI = config_keys['DATABASE_URI']
+    SQLALCHEMY_DATABASE_URI = config_key('DATABASE_URI')
+
+    # MongoDB connection pool, shared by every request in a worker process
+    MONGO_MAX_POOL_SIZE = config_key('MONGO_MAX_POOL_SIZE', 50)
+    MONGO_MIN_POOL_SIZE = config_key('MONGO_MIN_POOL_SIZE', 0)
+    MONGO_MAX_IDLE_TIME_MS = config_key('MONGO_MAX_IDLE_TIME_MS', 60000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = config_key('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = config_key('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)
+    MONGO_HEALTH_CHECK_INTERVAL = config_key('MONGO_HEALTH_CHECK_INTERVAL', 30)
+
+    # Build the indexes declared in db_indexes whenever an app is created (every worker and CLI command). Off by
+    # default: run `flask --app main db-indexes ensure` at deploy time instead
+    ENSURE_INDEXES_ON_STARTUP = config_key('ENSURE_INDEXES_ON_STARTUP', False)
+
+    # Open the MongoDB pool and build the S3 client when a worker boots instead of on its first request
+    WARM_UP_ON_START = config_key('WARM_UP_ON_START', False)
+
+    # Verified admin tokens kept in memory per worker; the TTL bounds how long a revoked token stays usable
+    TOKEN_CACHE_SIZE = config_key('TOKEN_CACHE_SIZE', 1024)
+    TOKEN_CACHE_TTL = config_key('TOKEN_CACHE_TTL', 30)
+
+    # Public catalog responses (/user/*). "local" keeps entries per worker and invalidates through the shared
+    # catalog version in MongoDB; "redis" (RESPONSE_CACHE_URL) shares the entries across workers as well
+    RESPONSE_CACHE_ENABLED = config_key('RESPONSE_CACHE_ENABLED', True)
+    RESPONSE_CACHE_BACKEND = config_key('RESPONSE_CACHE_BACKEND', 'local')
+    RESPONSE_CACHE_URL = config_key('RESPONSE_CACHE_URL', None)
+    RESPONSE_CACHE_TTL = config_key('RESPONSE_CACHE_TTL', 60)
+    RESPONSE_CACHE_SIZE = config_key('RESPONSE_CACHE_SIZE', 512)
+
+    # Cache-Control per blueprint name, overriding the defaults set next to each blueprint
+    CACHE_CONTROL = config_key('CACHE_CONTROL', {})
+
+    # Uploaded files above this size are spooled to a temporary file instead of memory
+    UPLOAD_SPOOL_MAX_MEMORY = config_key('UPLOAD_SPOOL_MAX_MEMORY', 500 * 1024)
+
+    # Content uploads: ASYNC_UPLOADS makes 202 + job id the default (?async=0/1 overrides per request); the S3
+    # transfer runs on UPLOAD_WORKERS threads per process from files spooled under UPLOAD_SPOOL_DIR
+    ASYNC_UPLOADS = config_key('ASYNC_UPLOADS', False)
+    UPLOAD_WORKERS = config_key('UPLOAD_WORKERS', 4)
+    UPLOAD_SPOOL_DIR = config_key('UPLOAD_SPOOL_DIR', None)
+    UPLOAD_PROGRESS_STEP = config_key('UPLOAD_PROGRESS_STEP', 10)
+    UPLOAD_JOB_TTL = config_key('UPLOAD_JOB_TTL', 24 * 60 * 60)
+
+    # Prometheus text format on GET /metrics (per worker process). Off unless enabled; with METRICS_TOKEN set the
+    # scraper must send "Authorization: Bearer <token>"
+    METRICS_ENABLED = config_key('METRICS_ENABLED', False)
+    METRICS_TOKEN = config_key('METRICS_TOKEN', None)
+
+    # Per-request profiling (app/profiling.py): "off", "header" (requests sending X-Profile: 1) or "always".
+    # PROFILE_SAMPLE_RATE of the profiled requests are also dumped as cProfile stats under PROFILE_DIR
+    PROFILING_MODE = config_key('PROFILING_MODE', 'off')
+    PROFILING_HEADER = config_key('PROFILING_HEADER', 'X-Profile')
+    PROFILE_SAMPLE_RATE = config_key('PROFILE_SAMPLE_RATE', 0.0)
+    PROFILE_DIR = config_key('PROFILE_DIR', None)
+
+
+# boto3 clients are thread-safe but expensive to build, so one client per credential set is kept for the
+# lifetime of the worker process. Sessions are not thread-safe and are only touched under the lock.
+_s3_clients = {}
+_s3_clients_pid = None
+_s3_clients_lock = threading.Lock()
+# Called with every new client, e.g. to register botocore event handlers for metrics
+s3_client_hooks = []
+
+# Bucket statistics are informational only and are refreshed on demand or in the background
+_bucket_stats = {}
+_bucket_stats_lock = threading.Lock()
+
+
+def get_cached_s3_client(access_key, secret_key, region_name, max_pool_connections=50, endpoint_url=None):
+    global _s3_clients_pid
+    key = (access_key, secret_key, region_name, endpoint_url)
+    with _s3_clients_lock:
+        if _s3_clients_pid != os.getpid():
+            _s3_clients.clear()
+            _s3_clients_pid = os.getpid()
+        client = _s3_clients.get(key)
+        if client is None:
+            # boto3 is imported on first use: it accounts for a large share of import time
+            import boto3
+            import botocore.config
+
+            session = boto3.session.Session(aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+                                            region_name=region_name)
+            client = session.client('s3', endpoint_url=endpoint_url,
+                                    config=botocore.config.Config(max_pool_connections=max_pool_connections))
+            for hook in s3_client_hooks:
+                hook(client)
+            _s3_clients[key] = client
+        return client
+
+
+def reset_s3_clients():
+    global _s3_clients_pid
+    with _s3_clients_lock:
+        _s3_clients.clear()
+        _s3_clients_pid = None
 
 
 class S3Config:
     def __init__(self):
+        config_keys = load_config_keys()
         self.bucket_name = config_keys['bucket_name']
         self.access_key = config_keys['aws_access_key_id']
         self.secret_key = config_keys['aws_secret_access_key']
         self.region_name = config_keys['region_name']
+        self.max_pool_connections = config_keys.get('S3_MAX_POOL_CONNECTIONS', 50)
+        self.bucket_stats_ttl = config_keys.get('S3_BUCKET_STATS_TTL', 300)
+        self.endpoint_url = config_keys.get('S3_ENDPOINT_URL')
+        self.upload_max_workers = config_keys.get('S3_UPLOAD_MAX_WORKERS', 8)
+        self.multipart_threshold = config_keys.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024)
+        self.multipart_chunksize = config_keys.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024)
+        self.max_concurrency = config_keys.get('S3_MAX_CONCURRENCY', 4)
 
     def get_s3_client(self):
+        import botocore.exceptions
+
         try:
-            return boto3.client('s3', aws_access_key_id=self.access_key,
-                                aws_secret_access_key=self.secret_key,
-                                region_name=self.region_name)
+            return get_cached_s3_client(self.access_key, self.secret_key, self.region_name,
+                                        max_pool_connections=self.max_pool_connections,
+                                        endpoint_url=self.endpoint_url)
         except botocore.exceptions.NoCredentialsError:
             print("Error: No AWS credentials found.")
             return None
@@ -33,6 +177,14 @@ class S3Config:
             print(f"Error creating S3 client: {str(e)}")
             return None
 
+    def get_transfer_config(self):
+        from boto3.s3.transfer import TransferConfig
+
+        return TransferConfig(multipart_threshold=self.multipart_threshold,
+                              multipart_chunksize=self.multipart_chunksize,
+                              max_concurrency=self.max_concurrency,
+                              use_threads=self.max_concurrency > 1)
+
     def get_bucket_name(self):
         return self.bucket_name
 
@@ -40,6 +192,8 @@ class S3Config:
         return self.region_name
 
     def get_bucket_status(self):
+        import botocore.exceptions
+
         s3 = self.get_s3_client()
         if s3 is None:
             return "Error: Unable to create S3 client."
@@ -55,6 +209,8 @@ class S3Config:
             return f"Error accessing bucket: {str(e)}"
 
     def get_total_files(self):
+        import botocore.exceptions
+
         s3 = self.get_s3_client()
         if s3 is None:
             return "Error: Unable to create S3 client."
@@ -70,6 +226,8 @@ class S3Config:
             return f"Error listing objects: {str(e)}"
 
     def get_total_files_in_all_folders(self):
+        import botocore.exceptions
+
         s3 = self.get_s3_client()
         if s3 is None:
             return "Error: Unable to create S3 client."
@@ -90,35 +248,52 @@ class S3Config:
         except Exception as e:
             return f"Error listing objects: {str(e)}"
 
-    def connect_to_s3(self):
-        print(f"Connecting to S3 bucket {self.bucket_name}...")
-        bucket_status = self.get_bucket_status()
-        total_files = self.get_total_files()
-        all_folders = self.get_total_files_in_all_folders()
-        print(f"S3 bucket status: {bucket_status}")
-        print(f"Total files in S3 bucket: {total_files}")
-        print(f"Total files in all folders: {all_folders}")
-        return bucket_status, total_files, all_folders
+    def refresh_bucket_stats(self):
+        stats = (self.get_bucket_status(), self.get_total_files(), self.get_total_files_in_all_folders())
+        with _bucket_stats_lock:
+            _bucket_stats[self.bucket_name] = {"stats": stats, "refreshed_at": time.monotonic(), "refreshing": False}
+        return stats
+
+    def refresh_bucket_stats_async(self):
+        with _bucket_stats_lock:
+            entry = _bucket_stats.setdefault(self.bucket_name, {"stats": None, "refreshed_at": 0.0,
+                                                                "refreshing": False})
+            if entry["refreshing"]:
+                return
+            entry["refreshing"] = True
+        threading.Thread(target=self.refresh_bucket_stats, name="s3-bucket-stats", daemon=True).start()
+
+    def connect_to_s3(self, background=False):
+        # Cached bucket status, total files and per-folder counts; nothing here is needed for an upload
+        with _bucket_stats_lock:
+            entry = _bucket_stats.get(self.bucket_name)
+        fresh = entry and entry["stats"] and time.monotonic() - entry["refreshed_at"] < self.bucket_stats_ttl
+        if fresh:
+            return entry["stats"]
+        if background:
+            self.refresh_bucket_stats_async()
+            return entry["stats"] if entry and entry["stats"] else ("Refreshing", None, None)
+        return self.refresh_bucket_stats()
 
 
 class DevelopmentConfig(Config):
     DEBUG = True
     DEVELOPMENT = True
-    SECRET_KEY = config_keys['SECRET_KEY']
-    url_mongo = config_keys['MONGO_URL_LOCAL']
-    port_mongo = config_keys['PORT_MONGO']
-    db_name_mongo = config_keys['DB_NAME_MONGO']
+    SECRET_KEY = config_key('SECRET_KEY')
+    url_mongo = config_key('MONGO_URL_LOCAL')
+    port_mongo = config_key('PORT_MONGO')
+    db_name_mongo = config_key('DB_NAME_MONGO')
 
 
 class ProductionConfig(Config):
     DEBUG = True
     DEVELOPMENT = True
-    SECRET_KEY = config_keys['SECRET_KEY']
-    url_mongo = config_keys['MONGO_URL_REMOTE']
-    port_mongo = config_keys['PORT_MONGO']
-    db_name_mongo = config_keys['DB_NAME_MONGO']
-    db_username = config_keys['DB_USERNAME']
-    db_password = config_keys['DB_PASSWORD']
+    SECRET_KEY = config_key('SECRET_KEY')
+    url_mongo = config_key('MONGO_URL_REMOTE')
+    port_mongo = config_key('PORT_MONGO')
+    db_name_mongo = config_key('DB_NAME_MONGO')
+    db_username = config_key('DB_USERNAME')
+    db_password = config_key('DB_PASSWORD')
 
 
 app_config = {